@@ -0,0 +1,335 @@
+__doc__ = """
+
+Benchmarks for latticegpm, in airspeed velocity (asv) format.
+
+Each case times its function (`time_*`) and records its peak memory
+(`peakmem_*`). Before timing, `setup` checks the function's output against a
+straightforward reference implementation, so a faster but wrong version fails
+instead of showing up as an improvement.
+
+Run them with:
+
+    $ asv run
+    $ asv continuous master HEAD
+
+"""
+
+import itertools
+import numpy as np
+
+from latticeproteins.interactions import miyazawa_jernigan
+
+from latticegpm import thermo, search, svg
+from latticegpm.conformations import enumerate_conformations
+from latticegpm.epistasis import epistasis_from_phenotypes, walsh_hadamard
+from latticegpm.paths import count_accessible_paths, path_probability, top_paths
+from latticegpm.gpm import LatticeGenotypePhenotypeMap
+
+# Amino acids to build random sequences from.
+AMINO_ACIDS = np.array(sorted(set("".join(miyazawa_jernigan.keys()))))
+
+# Chain lengths benchmarked for the conformation-space functions.
+LENGTHS = [6, 10, 14]
+
+# Fold genotype maps in chunks this size so long chains fit in memory.
+CHUNKSIZE = 256
+
+# Code run in a fresh interpreter to time an import, failing if the import
+# pulled in an optional dependency that should only load on first use.
+IMPORT_CODE = """
+import sys
+import %s
+heavy = [m for m in ("gpmap", "pandas", "svgwrite", "IPython") if m in sys.modules]
+assert not heavy, "import loaded %%s" %% heavy
+"""
+
+_conformations = {}
+
+def conformations(length):
+    """All conformations of `length` residues, enumerated once per session."""
+    try:
+        return _conformations[length]
+    except KeyError:
+        _conformations[length] = enumerate_conformations(length)
+        return _conformations[length]
+
+def random_sequence(length, seed=0):
+    """Random sequence of `length` residues."""
+    rng = np.random.RandomState(seed)
+    return "".join(rng.choice(AMINO_ACIDS, size=length))
+
+def random_conformations(length, n, seed=0):
+    """`n` conformations of `length` residues, picked at random."""
+    index = conformations(length)
+    rng = np.random.RandomState(seed)
+    return [index.conf_list[i] for i in rng.randint(len(index), size=n)]
+
+def reference_contacts(sequence, conformation):
+    """Non-bonded contacts of a folded sequence, by checking every pair of sites."""
+    position = [(0, 0)]
+    for move in conformation:
+        dx, dy = thermo.MOVES[move]
+        position.append((position[-1][0] + dx, position[-1][1] + dy))
+    contacts = []
+    for i in range(len(position)):
+        for j in range(i + 2, len(position)):
+            if abs(position[i][0] - position[j][0]) + abs(position[i][1] - position[j][1]) == 1:
+                contacts.append("".join(sorted(sequence[i] + sequence[j])))
+    return sorted(contacts)
+
+def reference_energy(sequence, conformation):
+    """Energy of a folded sequence, summed over `reference_contacts`."""
+    energy = 0.0
+    for contact in reference_contacts(sequence, conformation):
+        try:
+            energy += miyazawa_jernigan[contact]
+        except KeyError:
+            energy += miyazawa_jernigan[contact[::-1]]
+    return energy
+
+def reference_stability(energies, temperature):
+    """Stability of the lowest-energy conformation, with a plain Boltzmann sum."""
+    energies = np.sort(energies)
+    if np.isclose(energies[0], energies[1]):
+        return 0.0
+    return energies[0] + temperature * np.log(np.sum(np.exp(-energies[1:] / temperature)))
+
+def check(condition, message):
+    """Fail a benchmark's setup if its output doesn't match the reference."""
+    if not condition:
+        raise AssertionError(message)
+
+
+class LatticeContacts(object):
+    """Contacts of one sequence in 100 conformations."""
+    params = LENGTHS
+    param_names = ["length"]
+
+    def setup(self, length):
+        self.sequence = random_sequence(length)
+        self.confs = random_conformations(length, 100)
+        for conf in self.confs:
+            contacts = sorted("".join(sorted(c)) for c in thermo.lattice_contacts(self.sequence, conf))
+            check(contacts == reference_contacts(self.sequence, conf), "lattice_contacts is wrong for %s" % conf)
+
+    def time_lattice_contacts(self, length):
+        for conf in self.confs:
+            thermo.lattice_contacts(self.sequence, conf)
+
+    def peakmem_lattice_contacts(self, length):
+        for conf in self.confs:
+            thermo.lattice_contacts(self.sequence, conf)
+
+
+class FoldEnergy(object):
+    """Energy of one sequence in 100 conformations."""
+    params = LENGTHS
+    param_names = ["length"]
+
+    def setup(self, length):
+        self.sequence = random_sequence(length)
+        self.confs = random_conformations(length, 100)
+        for conf in self.confs:
+            check(np.isclose(thermo.fold_energy(self.sequence, conf), reference_energy(self.sequence, conf)),
+                "fold_energy is wrong for %s" % conf)
+
+    def time_fold_energy(self, length):
+        for conf in self.confs:
+            thermo.fold_energy(self.sequence, conf)
+
+    def peakmem_fold_energy(self, length):
+        for conf in self.confs:
+            thermo.fold_energy(self.sequence, conf)
+
+
+class EnergyList(object):
+    """Energies of one sequence in every conformation."""
+    params = LENGTHS
+    param_names = ["length"]
+
+    def setup(self, length):
+        self.sequence = random_sequence(length)
+        self.index = conformations(length)
+        energies = thermo.energy_list(self.sequence, self.index)
+        confs = random_conformations(length, 100)
+        reference = [reference_energy(self.sequence, conf) for conf in confs]
+        check(np.allclose([energies[self.index.index(conf)] for conf in confs], reference),
+            "energy_list doesn't match fold_energy")
+
+    def time_energy_list(self, length):
+        thermo.energy_list(self.sequence, self.index)
+
+    def peakmem_energy_list(self, length):
+        thermo.energy_list(self.sequence, self.index)
+
+
+class Thermodynamics(object):
+    """Partition function and stability of one sequence from its energies."""
+    params = LENGTHS
+    param_names = ["length"]
+    temperature = 1.0
+
+    def setup(self, length):
+        self.sequence = random_sequence(length)
+        self.index = conformations(length)
+        self.energies = thermo.energy_list(self.sequence, self.index)
+        partition = thermo.partition_function_from_energies(self.energies, self.temperature)
+        check(np.isclose(partition, np.sum(np.exp(-self.energies / self.temperature))),
+            "partition_function_from_energies is wrong")
+        stability, folded = thermo.stability_from_energies(self.energies, self.temperature)
+        check(np.isclose(stability, reference_stability(self.energies, self.temperature)),
+            "stability_from_energies is wrong")
+
+    def time_partition_function_from_energies(self, length):
+        thermo.partition_function_from_energies(self.energies, self.temperature)
+
+    def time_stability_from_energies(self, length):
+        thermo.stability_from_energies(self.energies, self.temperature)
+
+    def time_fracfolded_from_energies(self, length):
+        thermo.fracfolded_from_energies(self.energies, self.temperature)
+
+    def time_stability_from_conf_list(self, length):
+        thermo.stability_from_conf_list(self.sequence, self.index, self.temperature)
+
+    def peakmem_stability_from_conf_list(self, length):
+        thermo.stability_from_conf_list(self.sequence, self.index, self.temperature)
+
+
+class LowestConformations(object):
+    """The 10 lowest conformations of a batch of sequences."""
+    params = (LENGTHS, [1, 100])
+    param_names = ["length", "n_sequences"]
+    k = 10
+
+    def setup(self, length, n_sequences):
+        self.sequences = [random_sequence(length, seed=i) for i in range(n_sequences)]
+        self.index = conformations(length)
+        states = search.get_lowest_confs(self.sequences, self.k, self.index)
+        energies = thermo.energy_list(self.sequences[0], self.index)
+        lowest = [energies[self.index.index(conf)] for conf in states[0]]
+        check(np.allclose(lowest, np.sort(energies)[:self.k]), "get_lowest_confs is wrong")
+
+    def time_get_lowest_confs(self, length, n_sequences):
+        search.get_lowest_confs(self.sequences, self.k, self.index)
+
+    def peakmem_get_lowest_confs(self, length, n_sequences):
+        search.get_lowest_confs(self.sequences, self.k, self.index)
+
+
+class GenotypePhenotypeMap(object):
+    """Build a complete binary genotype-phenotype map."""
+    params = (LENGTHS, [4, 8, 12])
+    param_names = ["length", "n_mutations"]
+    timeout = 600
+
+    def setup(self, length, n_mutations):
+        if n_mutations > length:
+            raise NotImplementedError("More mutations than sites.")
+        self.wildtype = random_sequence(length, seed=1)
+        mutant = random_sequence(length, seed=2)
+        self.mutations = {}
+        for site in range(length):
+            if site < n_mutations and mutant[site] != self.wildtype[site]:
+                self.mutations[site] = [self.wildtype[site], mutant[site]]
+            else:
+                self.mutations[site] = [self.wildtype[site]]
+        self.index = conformations(length)
+        gpm = self.build()
+        for i in np.linspace(0, len(gpm.genotypes) - 1, 10).astype(int):
+            lattice = thermo.LatticeThermodynamics(gpm.genotypes[i], self.index, 1.0)
+            check(np.isclose(gpm.phenotypes[i], lattice.stability), "map phenotypes are wrong")
+
+    def build(self):
+        return LatticeGenotypePhenotypeMap(self.wildtype, self.mutations,
+            conformations=self.index,
+            chunksize=CHUNKSIZE)
+
+    def time_map(self, length, n_mutations):
+        self.build()
+
+    def peakmem_map(self, length, n_mutations):
+        self.build()
+
+
+class Epistasis(object):
+    """All epistatic coefficients of a complete binary map of n sites."""
+    params = ([8, 14, 20], ["hadamard", "local"])
+    param_names = ["n_sites", "encoding"]
+
+    def setup(self, n_sites, encoding):
+        self.phenotypes = np.random.RandomState(0).rand(1 << n_sites)
+        if n_sites <= 10:
+            # Sylvester construction of the Hadamard matrix.
+            H = np.ones((1, 1))
+            for i in range(n_sites):
+                H = np.block([[H, H], [H, -H]])
+            keys, coefficients = epistasis_from_phenotypes(self.phenotypes, "hadamard")
+            check(np.allclose(H @ self.phenotypes, walsh_hadamard(self.phenotypes)), "walsh_hadamard is wrong")
+            check(np.allclose(H[:, keys] @ coefficients, self.phenotypes), "hadamard coefficients are wrong")
+
+    def time_epistasis(self, n_sites, encoding):
+        epistasis_from_phenotypes(self.phenotypes, encoding)
+
+    def peakmem_epistasis(self, n_sites, encoding):
+        epistasis_from_phenotypes(self.phenotypes, encoding)
+
+
+class AccessiblePaths(object):
+    """Count, weight and rank the accessible paths across a binary map of n sites."""
+    params = [8, 14, 18]
+    param_names = ["n_sites"]
+
+    def setup(self, n_sites):
+        # Fitness rises with the number of mutations, with noise, so many
+        # paths are accessible.
+        rng = np.random.RandomState(0)
+        positions = np.arange(1 << n_sites)
+        n_mutations = np.array([bin(p).count("1") for p in positions])
+        self.fitness = 1.0 + n_mutations + rng.rand(1 << n_sites)
+        if n_sites <= 8:
+            n_paths = 0
+            for sites in itertools.permutations(range(n_sites)):
+                genotypes = np.cumsum([0] + [1 << (n_sites - 1 - site) for site in sites])
+                n_paths += np.all(np.diff(self.fitness[genotypes]) > 0)
+            check(count_accessible_paths(self.fitness) == n_paths, "count_accessible_paths is wrong")
+
+    def time_count_accessible_paths(self, n_sites):
+        count_accessible_paths(self.fitness)
+
+    def time_path_probability(self, n_sites):
+        path_probability(self.fitness)
+
+    def time_top_paths(self, n_sites):
+        top_paths(self.fitness, 10)
+
+    def peakmem_top_paths(self, n_sites):
+        top_paths(self.fitness, 10)
+
+
+class Drawing(object):
+    """Render the SVG of a folded sequence."""
+    params = LENGTHS
+    param_names = ["length"]
+
+    def setup(self, length):
+        self.sequence = random_sequence(length)
+        self.conf = random_conformations(length, 1)[0]
+        data = svg.Configuration(self.sequence, self.conf).data
+        check(data.count("<text") >= length and data.count("<line") == length - 1,
+            "drawing doesn't have a letter per residue and a bond per move")
+
+    def time_configuration(self, length):
+        svg.Configuration(self.sequence, self.conf).data
+
+    def peakmem_configuration(self, length):
+        svg.Configuration(self.sequence, self.conf).data
+
+
+class ImportTime(object):
+    """Time to import the numeric core in a fresh interpreter."""
+    params = ["latticegpm", "latticegpm.thermo", "latticegpm.search", "latticegpm.svg"]
+    param_names = ["module"]
+
+    def timeraw_import(self, module):
+        return IMPORT_CODE % module
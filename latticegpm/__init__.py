@@ -1,2 +1,19 @@
-from .gpm import LatticeGenotypePhenotypeMap
-from .svg import draw
+# Only the numeric core is imported with the package. The genotype-phenotype
+# map (gpmap) and drawing (svgwrite) load on first use.
+_LAZY = {
+    "LatticeGenotypePhenotypeMap": ".gpm",
+    "draw": ".svg",
+}
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
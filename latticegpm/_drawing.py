@@ -0,0 +1,207 @@
+__doc__ = """
+
+Drawing classes behind `svg.Configuration` and `svg.Drawing`. They are kept
+apart from svg.py so that svgwrite is only imported once something is drawn.
+
+"""
+
+import svgwrite
+
+from .svg import COLORS, configuration_to_array
+from .geometry import geometry
+
+
+class Configuration(object):
+    """ Main class for drawing an SVG of a lattice protein's fold.
+
+    Parameters
+    ----------
+    sequence : str
+        Amino acid sequence
+    configuration : str
+        sequence of direction letters describing the 2d configuration.
+    colors : list of strings
+        list of colors for each amino acid in sequence
+    rotation : int
+        rotate the configuration by 0, 90, 180, or 270 degrees
+    font_size : int
+        Font size, in pixels, of sequence in configuration. The svg will scale
+        with the font size of the letters.
+
+    Examples
+    --------
+    >>> # Create an instance
+    >>> drawing = Configuration(sequence, configuration)
+    >>> # Save to file
+    >>> # drawing.save()
+    >>> # Print in Jupyter (IPython) notebook
+    >>> drawing.notebook
+    """
+    def __init__(self, sequence, configuration,
+        color_sequence=None,
+        rotation=0,
+        font_size=20,
+        dot_scale=1.0,
+        font_weight="normal"
+        ):
+        # Rotate configuration if given
+        # Set sequence and configuration
+        self.sequence = sequence
+        self.rotation = 0
+        self.font_size = font_size
+        self.dot_scale = dot_scale
+        self.font_weight = font_weight
+        # Set configuration
+        self.configuration = configuration
+        # set color
+        if color_sequence is None:
+            self.color_sequence = "k"*len(self.sequence)
+        elif len(color_sequence) != len(self.sequence):
+            raise Exception("color_sequence must have the same length as sequence.")
+        else:
+            self.color_sequence = color_sequence
+        # Sets rotation and configuration
+        self.rotate(rotation)
+
+    @property
+    def data(self):
+        """ Return svg as a string. """
+        return self.drawing.tostring()
+
+    def _repr_svg_(self):
+        """ Display in Jupyter (IPython) notebooks. """
+        return self.data
+
+    @property
+    def notebook(self):
+        """ Display SVG in Jupyther notebook. """
+        try:
+            # Import IPython display for notebook
+            from IPython.display import SVG as ipython_display
+            # Display in notebook
+            return ipython_display(self.data)
+        except ImportError:
+            raise Warning(""" IPython not installed. """)
+
+    def rotate(self, rotation):
+        """Rotate the drawing by 90, 180, or 270.
+        """
+        # Rotate svg if desired.
+        n = int(rotation/90)
+        self.rotation += n
+        if n > 0:
+            self.configuration = geometry(self.configuration).rotated(n).conformation
+        self._build_drawing()
+
+    def save(self, filename):
+        """ save svg """
+        self.drawing.saveas(filename)
+
+    def _add_item(self, x, y):
+        """Adds item at position (x,y) in array.
+        """
+        # Try if it's a bond
+        try:
+            if self.mapping[self.array[y][x]] is not None:
+                # Get SVG element to add
+                item = self.mapping[self.array[y][x]]
+                # Add element
+                item(2*self.offset+self.font_size*x,
+                    2*self.offset+self.font_size*y)
+        # Otherwise its a letter
+        except KeyError:
+            # Add color to specific letters if given
+            color = COLORS[self.color_array[y][x]]
+            self.drawing.letter(2*self.offset+self.font_size*x,
+                2*self.offset+self.font_size*y,
+                self.array[y][x],
+                color=color)
+
+    def _build_drawing(self):
+        """Build drawing object."""
+        self.array = configuration_to_array(self.sequence, self.configuration)
+        self.color_array = configuration_to_array(self.color_sequence, self.configuration)
+        # Build SVG grid object
+        self.shape = (len(self.array), len(self.array[0]))
+        self.height = self.font_size * self.shape[0]
+        self.width = self.font_size * self.shape[1]
+        self.drawing = Drawing(
+            font_size=self.font_size,
+            size=(self.width, self.height),
+            dot_scale=self.dot_scale
+        )
+        self.offset = 0.25 * self.font_size
+        # Object for how to draw a configuration
+        self.mapping = {"d":self.drawing.down,
+            "u":self.drawing.up,
+            "r":self.drawing.right,
+            "l":self.drawing.left,
+            ".":self.drawing.dot,
+            " ":None
+        }
+        # Draw grid in svg
+        for y in range(self.shape[0]):
+            for x in range(self.shape[1]):
+                self._add_item(x,y)
+
+class Drawing(svgwrite.Drawing):
+    """Wrap svgwrite.Drawing object with extra methods that make drawing lattice
+    proteins much easier
+    """
+    def __init__(self, font_size=20, dot_scale=1.0, font_weight="normal", **kwargs):
+        self.font_size = font_size
+        self.stepsize = 0.25*font_size
+        self.linewidth = 0.1*font_size
+        self.dot_scale = dot_scale
+        self.font_weight = font_weight
+        super(Drawing, self).__init__(**kwargs)
+
+    def bond(self, start, end):
+        """ Create an svg line object to add to a svgwrite drawing object.
+        """
+        line = self.line(start, end, stroke=svgwrite.rgb(10,10,16, '%'), style="stroke-width:" + str(self.linewidth))
+        self.add(line)
+
+    def right(self, x, y):
+        """ Add a right facing line to figure. """
+        start = (x-self.stepsize,y)
+        end = (x+self.stepsize,y)
+        self.bond(start,end)
+
+    def left(self, x, y):
+        """ Add a right facing line to figure. """
+        start = (x+self.stepsize,y)
+        end = (x-self.stepsize,y)
+        self.bond(start,end)
+
+    def up(self, x, y):
+        """ Add a right facing line to figure. """
+        start = (x,y-self.stepsize)
+        end = (x,y+self.stepsize)
+        self.bond(start, end)
+
+    def down(self, x, y):
+        """ Add a right facing line to figure. """
+        start = (x,y+self.stepsize)
+        end = (x,y-self.stepsize)
+        self.bond(start,end)
+
+    def letter(self, x, y, char, color="black"):
+        """ Add letter to grid where residues exist. """
+        xoffset = -self.stepsize-0.1*self.stepsize
+        yoffset = self.stepsize
+        letter = self.text(char, insert=(x + xoffset,y + yoffset),
+            style="font-size:"+str(self.font_size)+
+            "px;font-family:Courier;"
+            "font-weight:" + self.font_weight + ";"
+            "fill:" + str(color))
+        return self.add(letter)
+
+    def dot(self, x, y):
+        """ Add a dot on grid where no letter exists"""
+        xoffset = (-self.stepsize-0.15*self.stepsize)*self.dot_scale
+        yoffset = (self.stepsize/2)
+        letter = self.text('.', insert=(x + xoffset, y + yoffset),
+            style="font-size:"+str(self.font_size * self.dot_scale)+
+            "px;font-family:Courier")
+        return self.add(letter)
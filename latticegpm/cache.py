@@ -0,0 +1,352 @@
+__doc__ = """
+
+Persistent on-disk cache of folded lattice proteins.
+
+Energies and phenotypes are stored in a SQLite database, keyed by sequence and
+a hash of the model they were computed with (conformations, interaction
+energies, target and temperature), so that maps that share genotypes with
+earlier runs don't need to fold them again.
+
+`MemoryCache` keeps the same entries in memory instead, for the lifetime of
+a session; pass one object to everything that folds the same sequences
+(maps, LatticeThermodynamics, search.adaptive_walk2, search.sequence_space)
+to share it.
+
+Example call:
+
+    >>> cache = PhenotypeCache("folds.sqlite", max_entries=10**6)
+    >>> gpm = LatticeGenotypePhenotypeMap(wildtype, mutations, conformations=confs, cache=cache)
+    >>> # Single sequences check the cache for their conformation energies.
+    >>> lattice = LatticeThermodynamics(sequence, confs, 1.0, cache=cache)
+    >>> cache.stats
+    >>> # Share an in-memory cache between searches in one session.
+    >>> memo = MemoryCache(max_entries=10**5)
+    >>> path = adaptive_walk2(wildtype, 5, conformations=confs, cache=memo)
+
+"""
+
+import os
+import time
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+# Max number of sequences per SQL query (SQLite limits the number of variables).
+QUERY_SIZE = 500
+
+# Fraction of `max_entries` freed when a PhenotypeCache table is full, so
+# that tables aren't counted and trimmed on every insert.
+EVICT_FRACTION = 0.1
+
+# Phenotypes stored for each sequence, in the order of the phenotypes table.
+PHENOTYPES = ("stability", "fracfolded", "folded", "native_conf", "native_energy", "log_partition_function")
+
+def conformations_hash(conf_list, degeneracy=None):
+    """Hash a list of conformations (and their degeneracies)."""
+    digest = hashlib.sha1()
+    digest.update("\n".join([str(c) for c in conf_list]).encode("ascii"))
+    if degeneracy is not None:
+        digest.update(np.ascontiguousarray(degeneracy, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+def interactions_hash(interaction_energies):
+    """Hash a dictionary of interaction energies."""
+    items = sorted(interaction_energies.items())
+    digest = hashlib.sha1(repr(items).encode("ascii"))
+    return digest.hexdigest()
+
+def model_key(conf_digest, interaction_energies, target=None, temperature=None):
+    """Build the key of a lattice model for the cache.
+
+    Parameters
+    ----------
+    conf_digest : str
+        hash of the conformations; see `conformations_hash`.
+    interaction_energies : dict
+        mapping of two-letter contacts to their energies.
+    target : str (optional)
+        target conformation.
+    temperature : float (optional)
+        temperature. Energies only depend on the conformations and interaction
+        energies; leave `target` and `temperature` as None to get their key.
+    """
+    key = [conf_digest, interactions_hash(interaction_energies)]
+    if target is not None or temperature is not None:
+        key += [str(target), repr(float(temperature))]
+    return ":".join(key)
+
+
+class PhenotypeCache(object):
+    """Persistent cache of per-sequence energies and phenotypes.
+
+    Parameters
+    ----------
+    path : str
+        SQLite database file. Created if it doesn't exist.
+    max_entries : int
+        maximum number of sequences to keep in each table. The least recently
+        used entries are evicted first; when a table is full,
+        `EVICT_FRACTION` of it is freed at once.
+
+    Attributes
+    ----------
+    hits : int
+        number of sequences found in the cache.
+    misses : int
+        number of sequences not found in the cache.
+    evictions : int
+        number of entries evicted to stay under `max_entries`.
+    """
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # sqlite3 is only needed once a persistent cache is opened.
+        import sqlite3
+        self._binary = sqlite3.Binary
+        self.connection = sqlite3.connect(path)
+        # Caches from before the partition function was stored as a log
+        # can't be read; drop their phenotypes so they are folded again.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(phenotypes)")]
+        if "partition_function" in columns:
+            self.connection.execute("DROP TABLE phenotypes")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS energies (
+            model TEXT, sequence TEXT, energies BLOB, last_used REAL,
+            PRIMARY KEY (model, sequence))""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS phenotypes (
+            model TEXT, sequence TEXT, stability REAL, fracfolded REAL,
+            folded INTEGER, native_conf INTEGER, native_energy REAL,
+            log_partition_function REAL, last_used REAL,
+            PRIMARY KEY (model, sequence))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS energies_lru ON energies (last_used)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS phenotypes_lru ON phenotypes (last_used)")
+        self.connection.commit()
+        # Upper bound on the rows in each table: inserts that replace a row
+        # are counted too, so tables are only counted once this passes
+        # `max_entries`.
+        self._rows = {"energies": self._count("energies"), "phenotypes": self._count("phenotypes")}
+
+    @property
+    def stats(self):
+        """Hit/miss statistics and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": float(self.hits) / lookups if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+            "energies": self._count("energies"),
+            "phenotypes": self._count("phenotypes"),
+        }
+
+    def get_energies(self, sequence, key):
+        """Get the cached energies of a sequence (None if not cached)."""
+        row = self.connection.execute(
+            "SELECT energies FROM energies WHERE model=? AND sequence=?",
+            (key, sequence)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute(
+            "UPDATE energies SET last_used=? WHERE model=? AND sequence=?",
+            (time.time(), key, sequence))
+        self.connection.commit()
+        return np.frombuffer(row[0], dtype=float).copy()
+
+    def set_energies(self, sequence, key, energies):
+        """Store the energies of a sequence."""
+        energies = np.ascontiguousarray(energies, dtype=float)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO energies VALUES (?, ?, ?, ?)",
+            (key, sequence, self._binary(energies.tobytes()), time.time()))
+        self._evict("energies", 1)
+        self.connection.commit()
+
+    def get_phenotypes(self, sequences, key):
+        """Get the cached phenotypes of many sequences.
+
+        Returns
+        -------
+        phenotypes : dict
+            mapping of each cached sequence to a tuple with its values for
+            PHENOTYPES. Sequences that aren't cached are left out.
+        """
+        sequences = list(sequences)
+        phenotypes = {}
+        now = time.time()
+        for start in range(0, len(sequences), QUERY_SIZE):
+            chunk = sequences[start:start + QUERY_SIZE]
+            marks = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT sequence, %s FROM phenotypes "
+                "WHERE model=? AND sequence IN (%s)" % (", ".join(PHENOTYPES), marks),
+                [key] + chunk).fetchall()
+            for row in rows:
+                stability, fracfolded, folded, native_conf, native_energy, log_partition_function = row[1:]
+                phenotypes[row[0]] = (stability, fracfolded, bool(folded), native_conf,
+                    native_energy, log_partition_function)
+            self.connection.execute(
+                "UPDATE phenotypes SET last_used=? WHERE model=? AND sequence IN (%s)" % marks,
+                [now, key] + chunk)
+        self.connection.commit()
+        self.hits += len(phenotypes)
+        self.misses += len(sequences) - len(phenotypes)
+        return phenotypes
+
+    def set_phenotypes(self, sequences, key, table):
+        """Store the phenotypes of many sequences.
+
+        Parameters
+        ----------
+        sequences : list of str
+            sequences to store.
+        key : str
+            model key; see `model_key`.
+        table : dict of arrays
+            one array per name in PHENOTYPES, with a value for each sequence.
+        """
+        now = time.time()
+        columns = zip(*[table[name] for name in PHENOTYPES])
+        rows = [(key, s, float(st), float(ff), int(f), int(n), float(e), float(p), now)
+            for s, (st, ff, f, n, e, p) in zip(sequences, columns)]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO phenotypes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._evict("phenotypes", len(rows))
+        self.connection.commit()
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self.connection.execute("DELETE FROM energies")
+        self.connection.execute("DELETE FROM phenotypes")
+        self.connection.commit()
+        self._rows = {"energies": 0, "phenotypes": 0}
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def _count(self, table):
+        """Number of entries in a table."""
+        return self.connection.execute("SELECT COUNT(*) FROM %s" % table).fetchone()[0]
+
+    def _evict(self, table, inserted):
+        """Remove the least recently used entries once a table holds more than
+        `max_entries`, down to `EVICT_FRACTION` below it.
+        """
+        self._rows[table] += inserted
+        if self._rows[table] <= self.max_entries:
+            return
+        self._rows[table] = self._count(table)
+        if self._rows[table] > self.max_entries:
+            keep = min(self.max_entries, max(1, int(self.max_entries * (1 - EVICT_FRACTION))))
+            excess = self._rows[table] - keep
+            self.connection.execute(
+                "DELETE FROM %s WHERE rowid IN "
+                "(SELECT rowid FROM %s ORDER BY last_used LIMIT ?)" % (table, table),
+                (excess,))
+            self.evictions += excess
+            self._rows[table] = keep
+
+
+class MemoryCache(object):
+    """In-memory cache of per-sequence energies and phenotypes, with the same
+    interface as `PhenotypeCache`.
+
+    Parameters
+    ----------
+    max_entries : int
+        maximum number of sequences to keep in each table. The least recently
+        used entries are evicted first.
+
+    Attributes
+    ----------
+    hits : int
+        number of sequences found in the cache.
+    misses : int
+        number of sequences not found in the cache.
+    evictions : int
+        number of entries evicted to stay under `max_entries`.
+    """
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.energies = OrderedDict()
+        self.phenotypes = OrderedDict()
+
+    @property
+    def stats(self):
+        """Hit/miss statistics and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": float(self.hits) / lookups if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+            "energies": len(self.energies),
+            "phenotypes": len(self.phenotypes),
+        }
+
+    def get_energies(self, sequence, key):
+        """Get the cached energies of a sequence (None if not cached)."""
+        energies = self._get(self.energies, (key, sequence))
+        if energies is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return energies.copy()
+
+    def set_energies(self, sequence, key, energies):
+        """Store the energies of a sequence."""
+        self._set(self.energies, (key, sequence), np.array(energies, dtype=float))
+
+    def get_phenotypes(self, sequences, key):
+        """Get the cached phenotypes of many sequences; see `PhenotypeCache.get_phenotypes`."""
+        phenotypes = {}
+        for sequence in sequences:
+            row = self._get(self.phenotypes, (key, sequence))
+            if row is not None:
+                phenotypes[sequence] = row
+        self.hits += len(phenotypes)
+        self.misses += len(sequences) - len(phenotypes)
+        return phenotypes
+
+    def set_phenotypes(self, sequences, key, table):
+        """Store the phenotypes of many sequences; see `PhenotypeCache.set_phenotypes`."""
+        columns = zip(*[table[name] for name in PHENOTYPES])
+        for sequence, (st, ff, f, n, e, p) in zip(sequences, columns):
+            row = (float(st), float(ff), bool(f), int(n), float(e), float(p))
+            self._set(self.phenotypes, (key, sequence), row)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self.energies.clear()
+        self.phenotypes.clear()
+
+    def close(self):
+        """Nothing to close; kept for compatibility with `PhenotypeCache`."""
+        pass
+
+    def _get(self, table, key):
+        """Get an entry and mark it as the most recently used (None if missing)."""
+        try:
+            value = table.pop(key)
+        except KeyError:
+            return None
+        table[key] = value
+        return value
+
+    def _set(self, table, key, value):
+        """Store an entry, evicting the least recently used above `max_entries`."""
+        table.pop(key, None)
+        table[key] = value
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,395 @@
+__doc__ = """
+
+Enumerate the conformations of 2d lattice proteins without a database.
+
+Conformations are self-avoiding walks on a square lattice. Walks that are
+rotations or reflections of each other are enumerated once: every
+conformation starts with 'U' and its first turn is 'R'. The enumeration is
+split by prefix, so prefixes can be folded in parallel and saved to a
+checkpoint directory as they finish.
+
+Conformations are kept packed, 2 bits per move, and are only decoded to
+strings (e.g. 'UDLLDRU') when one is looked up. A set of conformations and
+its contacts can be saved to a directory and memory-mapped back, so that
+many processes share one read-only copy.
+
+Example call:
+
+    >>> # All conformations of 12-residue proteins, using 4 processes.
+    >>> index = enumerate_conformations(12, n_jobs=4, checkpoint="confs12/")
+    >>> lattice = LatticeThermodynamics(sequence, index, 1.0)
+    >>> # Save them, and memory-map them in another session.
+    >>> save_conformations("confs12.store", index)
+    >>> index = load_conformations("confs12.store")
+
+"""
+
+import os
+import json
+import multiprocessing
+import numpy as np
+
+from .thermo import MOVES, ConformationIndex
+
+# Move letters, indexed by their code in arrays of moves.
+MOVE_LETTERS = "UDLR"
+
+# Default number of moves in the prefixes that enumeration is split into.
+PREFIX_DEPTH = 6
+
+# Number of moves packed into each 64-bit word of a packed conformation.
+MOVES_PER_WORD = 32
+
+# Number of conformations decoded at a time when iterating.
+DECODE_SIZE = 4096
+
+# Version of the on-disk conformation store.
+STORE_VERSION = 1
+
+def encode_moves(conf_list):
+    """Convert conformation strings (e.g. 'UDLLDRU') into a 2d array of move codes.
+    """
+    table = np.zeros(256, dtype=np.uint8)
+    for code, letter in enumerate(MOVE_LETTERS):
+        table[ord(letter)] = code
+    conf_list = list(conf_list)
+    chars = np.frombuffer("".join(conf_list).encode("ascii"), dtype=np.uint8)
+    return table[chars].reshape(len(conf_list), -1)
+
+def decode_moves(moves):
+    """Convert a 2d array of move codes into a list of conformation strings.
+    """
+    letters = np.frombuffer(MOVE_LETTERS.encode("ascii"), dtype=np.uint8)
+    chars = letters[np.asarray(moves)]
+    return [row.tobytes().decode("ascii") for row in chars]
+
+def pack_moves(moves):
+    """Pack a 2d array of move codes into 2 bits per move.
+
+    Returns
+    -------
+    words : 2d array of uint64
+        one row of ceil(n_moves / MOVES_PER_WORD) words per conformation. The
+        first move of each word is in its lowest bits.
+    """
+    moves = np.asarray(moves, dtype=np.uint64)
+    n_words = max(1, -(-moves.shape[1] // MOVES_PER_WORD))
+    padded = np.zeros((len(moves), n_words * MOVES_PER_WORD), dtype=np.uint64)
+    padded[:, :moves.shape[1]] = moves
+    shifts = 2 * np.arange(MOVES_PER_WORD, dtype=np.uint64)
+    padded = padded.reshape(len(moves), n_words, MOVES_PER_WORD) << shifts
+    return np.bitwise_or.reduce(padded, axis=2)
+
+def unpack_moves(words, n_moves):
+    """Unpack words from `pack_moves` into a 2d array of `n_moves` move codes per row."""
+    words = np.asarray(words, dtype=np.uint64)
+    shifts = 2 * np.arange(MOVES_PER_WORD, dtype=np.uint64)
+    moves = (words[:, :, None] >> shifts) & np.uint64(3)
+    return moves.reshape(len(words), -1)[:, :n_moves].astype(np.uint8)
+
+def conformation_prefixes(length, depth=PREFIX_DEPTH):
+    """Get every symmetry-reduced conformation prefix with `depth` moves (or
+    fewer, if the conformations are shorter).
+    """
+    depth = min(depth, length - 1)
+    prefixes = []
+    _extend(list(_walk("")), depth, prefixes.append, contacts=False)
+    return ["".join(MOVE_LETTERS[m] for m in moves) for moves, _ in prefixes]
+
+def enumerate_prefix(length, prefix):
+    """Enumerate the symmetry-reduced conformations of `length` residues that
+    start with `prefix`.
+
+    Returns
+    -------
+    moves : 2d array of uint8
+        move codes of each conformation (see MOVE_LETTERS).
+    contact_i, contact_j, conf_ids : arrays of ints
+        non-bonded contacts of every conformation, sorted within each
+        conformation.
+    """
+    moves, contact_i, contact_j, conf_ids = [], [], [], []
+
+    def record(walk):
+        conf_moves, contacts = walk
+        for i, j in sorted(contacts):
+            contact_i.append(i)
+            contact_j.append(j)
+            conf_ids.append(len(moves))
+        moves.append(conf_moves)
+
+    _extend(list(_walk(prefix)), length - 1, record)
+    return (np.array(moves, dtype=np.uint8).reshape(len(moves), length - 1),
+        np.array(contact_i, dtype=int),
+        np.array(contact_j, dtype=int),
+        np.array(conf_ids, dtype=int))
+
+def enumerate_conformations(length, depth=PREFIX_DEPTH, n_jobs=1, checkpoint=None):
+    """Enumerate all conformations of `length` residues, once per
+    rotation/reflection class.
+
+    Parameters
+    ----------
+    length : int
+        number of residues.
+    depth : int
+        number of moves in the prefixes the enumeration is split into.
+    n_jobs : int
+        number of processes to enumerate prefixes in (-1 for all CPUs).
+    checkpoint : str (optional)
+        directory to save each prefix's conformations to. Prefixes that are
+        already saved there are loaded instead of enumerated again, so an
+        interrupted enumeration can be resumed.
+
+    Returns
+    -------
+    index : thermo.ConformationIndex
+        all conformations, with their contacts.
+    """
+    if length < 2:
+        raise Exception("length must be at least 2.")
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+    if checkpoint is not None and not os.path.exists(checkpoint):
+        os.makedirs(checkpoint)
+    tasks = [(length, prefix, checkpoint) for prefix in conformation_prefixes(length, depth)]
+    if n_jobs > 1:
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            results = pool.map(_enumerate_prefix_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_enumerate_prefix_task(task) for task in tasks]
+    # Join prefixes in order, shifting conformation ids.
+    offset = 0
+    moves, contact_i, contact_j, conf_ids = [], [], [], []
+    for m, i, j, ids in results:
+        moves.append(m)
+        contact_i.append(i)
+        contact_j.append(j)
+        conf_ids.append(ids + offset)
+        offset += len(m)
+    conformations = PackedConformations(pack_moves(np.concatenate(moves)), length)
+    contacts = (np.concatenate(contact_i), np.concatenate(contact_j), np.concatenate(conf_ids))
+    return ConformationIndex(conformations, contacts=contacts)
+
+def save_conformations(path, conformations):
+    """Save conformations and their contacts to a store directory.
+
+    The store holds a header, the packed moves of each conformation, a
+    (3, n_contacts) table of contact_i, contact_j and conf_ids, and the
+    degeneracy of each conformation, as .npy files that `load_conformations`
+    memory-maps.
+
+    Parameters
+    ----------
+    path : str
+        directory to save to. Created if it doesn't exist.
+    conformations : list of str, PackedConformations or thermo.ConformationIndex
+        conformations to save.
+    """
+    if not isinstance(conformations, ConformationIndex):
+        conformations = ConformationIndex(conformations)
+    conf_list = conformations.conf_list
+    if isinstance(conf_list, PackedConformations):
+        words = conf_list.words
+    else:
+        words = pack_moves(encode_moves(conf_list))
+    if not os.path.exists(path):
+        os.makedirs(path)
+    header = {"version": STORE_VERSION, "length": conformations.length, "size": len(conformations)}
+    with open(os.path.join(path, "header.json"), "w") as f:
+        json.dump(header, f)
+    np.save(os.path.join(path, "moves.npy"), np.ascontiguousarray(words, dtype=np.uint64))
+    contacts = np.vstack((conformations.contact_i, conformations.contact_j, conformations.conf_ids))
+    np.save(os.path.join(path, "contacts.npy"), contacts.astype(int))
+    np.save(os.path.join(path, "degeneracy.npy"), conformations.degeneracy.astype(int))
+
+def load_conformations(path):
+    """Memory-map a store saved with `save_conformations`.
+
+    The arrays are opened read-only with np.memmap, so processes that load
+    the same store share its pages instead of each holding a copy.
+
+    Returns
+    -------
+    index : thermo.ConformationIndex
+        conformations in the store, with their contacts.
+    """
+    with open(os.path.join(path, "header.json")) as f:
+        header = json.load(f)
+    if header["version"] != STORE_VERSION:
+        raise Exception("Unknown conformation store version: %s" % header["version"])
+    words = np.load(os.path.join(path, "moves.npy"), mmap_mode="r")
+    contacts = np.load(os.path.join(path, "contacts.npy"), mmap_mode="r")
+    degeneracy = np.load(os.path.join(path, "degeneracy.npy"), mmap_mode="r")
+    conformations = PackedConformations(words, header["length"])
+    return ConformationIndex(conformations, degeneracy=degeneracy, contacts=contacts)
+
+
+class PackedConformations(object):
+    """List-like set of conformations packed into 2 bits per move.
+
+    Conformations are decoded to strings (e.g. 'UDLLDRU') one at a time, when
+    they are indexed or iterated over, so millions of them can be held (or
+    memory-mapped) without building a Python string for each.
+
+    Parameters
+    ----------
+    words : 2d array of uint64
+        packed moves of each conformation; see `pack_moves`.
+    length : int
+        length of sequences that fold into these conformations.
+    """
+    def __init__(self, words, length):
+        self.words = words
+        self.length = length
+
+    @classmethod
+    def from_strings(cls, conf_list):
+        """Pack a list of conformation strings."""
+        conf_list = list(conf_list)
+        return cls(pack_moves(encode_moves(conf_list)), len(conf_list[0]) + 1)
+
+    @property
+    def moves(self):
+        """2d array of the move codes of every conformation."""
+        return unpack_moves(self.words, self.length - 1)
+
+    def decode(self):
+        """Decode every conformation to a string."""
+        return list(self)
+
+    def index(self, conformation):
+        """Get the position of a conformation."""
+        if len(conformation) != self.length - 1 or set(conformation) - set(MOVE_LETTERS):
+            raise ValueError("%s is not in the conformation index." % conformation)
+        record = pack_moves(encode_moves([conformation]))[0]
+        matches = np.where((self.words == record).all(axis=1))[0]
+        if len(matches) == 0:
+            raise ValueError("%s is not in the conformation index." % conformation)
+        return int(matches[0])
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, conformation):
+        try:
+            self.index(conformation)
+            return True
+        except ValueError:
+            return False
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            words = np.asarray(self.words[item]).reshape(1, -1)
+            return decode_moves(unpack_moves(words, self.length - 1))[0]
+        return PackedConformations(self.words[item], self.length)
+
+    def __iter__(self):
+        for start in range(0, len(self), DECODE_SIZE):
+            words = self.words[start:start + DECODE_SIZE]
+            for conformation in decode_moves(unpack_moves(words, self.length - 1)):
+                yield conformation
+
+    def __repr__(self):
+        return "<PackedConformations: %d conformations of length %d>" % (len(self), self.length)
+
+def _enumerate_prefix_task(task):
+    """Enumerate one prefix, loading it from (or saving it to) the checkpoint directory."""
+    length, prefix, checkpoint = task
+    if checkpoint is None:
+        return enumerate_prefix(length, prefix)
+    filename = os.path.join(checkpoint, "%d-%s.npz" % (length, prefix))
+    if os.path.exists(filename):
+        data = np.load(filename)
+        return data["moves"], data["contact_i"], data["contact_j"], data["conf_ids"]
+    moves, contact_i, contact_j, conf_ids = enumerate_prefix(length, prefix)
+    # Write to a temporary file first so an interrupted save isn't loaded later.
+    temporary = filename + ".tmp.npz"
+    np.savez(temporary, moves=moves, contact_i=contact_i, contact_j=contact_j, conf_ids=conf_ids)
+    os.rename(temporary, filename)
+    return moves, contact_i, contact_j, conf_ids
+
+def _walk(prefix):
+    """Walk a prefix and get the state needed to extend it.
+
+    Returns
+    -------
+    moves : list of ints
+        move codes of the prefix.
+    path : list of tuples
+        coordinates of each site.
+    occupied : dict
+        mapping of coordinates to sites.
+    contacts : list of tuples
+        non-bonded contacts in the prefix.
+    turned : bool
+        True if the prefix has turned (i.e. isn't a straight line).
+    """
+    path = [(0, 0)]
+    occupied = {(0, 0): 0}
+    moves, contacts = [], []
+    turned = False
+    for letter in prefix:
+        if not _allowed(letter, len(moves), turned):
+            raise Exception("%s is not a symmetry-reduced conformation prefix." % prefix)
+        x, y = path[-1]
+        dx, dy = MOVES[letter]
+        position = (x + dx, y + dy)
+        if position in occupied:
+            raise Exception("%s is not a self-avoiding walk." % prefix)
+        site = len(path)
+        for ndx, ndy in MOVES.values():
+            neighbor = occupied.get((position[0] + ndx, position[1] + ndy))
+            if neighbor is not None and neighbor != site - 1:
+                contacts.append((neighbor, site))
+        moves.append(MOVE_LETTERS.index(letter))
+        path.append(position)
+        occupied[position] = site
+        turned = turned or letter != "U"
+    return moves, path, occupied, contacts, turned
+
+def _allowed(letter, n_moves, turned):
+    """Check that a move keeps a walk in its symmetry-reduced form: the first
+    move is 'U' and the first turn is 'R'.
+    """
+    if n_moves == 0:
+        return letter == "U"
+    if not turned:
+        return letter in "UR"
+    return True
+
+def _extend(state, n_moves, callback, contacts=True):
+    """Extend a walk in every self-avoiding way until it has `n_moves` moves,
+    and call `callback((moves, contacts))` for each.
+    """
+    moves, path, occupied, found, turned = state
+    if len(moves) == n_moves:
+        callback((list(moves), list(found)))
+        return
+    x, y = path[-1]
+    site = len(path)
+    for code, letter in enumerate(MOVE_LETTERS):
+        if not _allowed(letter, len(moves), turned):
+            continue
+        dx, dy = MOVES[letter]
+        position = (x + dx, y + dy)
+        if position in occupied:
+            continue
+        n_found = len(found)
+        if contacts:
+            for ndx, ndy in MOVES.values():
+                neighbor = occupied.get((position[0] + ndx, position[1] + ndy))
+                if neighbor is not None and neighbor != site - 1:
+                    found.append((neighbor, site))
+        moves.append(code)
+        path.append(position)
+        occupied[position] = site
+        _extend((moves, path, occupied, found, turned or letter != "U"), n_moves, callback, contacts)
+        del occupied[position]
+        path.pop()
+        moves.pop()
+        del found[n_found:]
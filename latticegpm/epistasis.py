@@ -0,0 +1,113 @@
+__doc__ = """
+
+Epistasis of complete binary genotype-phenotype maps, from a fast
+Walsh-Hadamard transform.
+
+The phenotypes of a map with n mutated sites are put in a 2^n array, indexed
+by the genotypes' binary strings (see `utils.binary_index`). Every epistatic
+coefficient, up to order n, is then found with n vectorized butterfly passes
+over that array, in O(n * 2^n) time. The 2^n x 2^n model matrix a regression
+would build is never made.
+
+Two encodings are supported:
+
+    'hadamard' : background-averaged coefficients. Sites are encoded as +1
+        (wildtype) and -1 (mutant), and each coefficient is an average over
+        all genetic backgrounds.
+    'local' : biochemical coefficients. Sites are encoded as 0 (wildtype) and
+        1 (mutant), and coefficients are effects relative to the wildtype.
+
+Example call:
+
+    >>> sites, coefficients = gpm.epistasis(encoding="hadamard", order=2)
+    >>> coefficients[sites.index((3, 7))]
+
+"""
+
+import numpy as np
+
+ENCODINGS = ("hadamard", "local")
+
+def walsh_hadamard(values):
+    """Fast (unnormalized) Walsh-Hadamard transform of an array of length 2^n.
+
+    Returns a new array, H @ values, where H is the 2^n x 2^n Sylvester
+    Hadamard matrix.
+    """
+    values = np.array(values, dtype=float)
+    n = _n_sites(values)
+    for k in range(n):
+        pairs = values.reshape(-1, 2, 1 << k)
+        low = pairs[:, 0].copy()
+        pairs[:, 0] += pairs[:, 1]
+        pairs[:, 1] *= -1
+        pairs[:, 1] += low
+    return values
+
+def mobius(values):
+    """Fast Mobius transform of an array of length 2^n over the subsets of its
+    index bits: out[s] = sum of (-1)^|s - t| * values[t] over subsets t of s.
+    """
+    values = np.array(values, dtype=float)
+    n = _n_sites(values)
+    for k in range(n):
+        pairs = values.reshape(-1, 2, 1 << k)
+        pairs[:, 1] -= pairs[:, 0]
+    return values
+
+def coefficient_orders(n):
+    """Order (number of sites) of each of the 2^n coefficients."""
+    orders = np.zeros(1 << n, dtype=np.int8)
+    for k in range(n):
+        orders.reshape(-1, 2, 1 << k)[:, 1] += 1
+    return orders
+
+def epistasis_from_phenotypes(phenotypes, encoding="hadamard", order=None):
+    """Epistatic coefficients of a complete binary map.
+
+    Parameters
+    ----------
+    phenotypes : array of floats
+        phenotypes of all 2^n genotypes, indexed by their binary strings.
+    encoding : str
+        'hadamard' (background-averaged) or 'local' (biochemical).
+    order : int (optional)
+        highest order of coefficients to return. Defaults to n.
+
+    Returns
+    -------
+    keys : array of ints
+        coefficients' positions in the transform: bit n-1-k is set when
+        the k-th mutated site is part of the coefficient. Sorted by order,
+        then by sites.
+    coefficients : array of floats
+        value of each coefficient.
+    """
+    phenotypes = np.asarray(phenotypes, dtype=float)
+    n = _n_sites(phenotypes)
+    if encoding == "hadamard":
+        coefficients = walsh_hadamard(phenotypes) / len(phenotypes)
+    elif encoding == "local":
+        coefficients = mobius(phenotypes)
+    else:
+        raise Exception("encoding must be one of %s." % ", ".join(ENCODINGS))
+    orders = coefficient_orders(n)
+    if order is None or order >= n:
+        keys = np.arange(len(orders))
+    else:
+        keys = np.flatnonzero(orders <= order)
+    # Within an order, a larger position has earlier sites.
+    keys = keys[np.lexsort((-keys, orders[keys]))]
+    return keys, coefficients[keys]
+
+def key_sites(keys, sites):
+    """Convert coefficient positions into tuples of the sites they involve."""
+    n = len(sites)
+    return [tuple([sites[k] for k in range(n) if key >> (n - 1 - k) & 1]) for key in keys.tolist()]
+
+def _n_sites(values):
+    """Number of sites of a 2^n array; raise an error if its length isn't a power of two."""
+    n = int(len(values)).bit_length() - 1
+    if values.ndim != 1 or len(values) != 1 << n:
+        raise Exception("phenotypes must be a 1d array with 2^n values.")
+    return n
@@ -0,0 +1,140 @@
+__doc__ = """
+
+Geometry of lattice protein conformations, shared by the energy and drawing
+code.
+
+A `Geometry` walks a conformation once, with a cumulative sum over its moves,
+and caches what is derived from the walk: the coordinates of every site, the
+bounding box, the non-bonded contacts and rotated copies. `geometry` returns
+the same object for the same conformation string, so code that handles a
+conformation many times only walks it once.
+
+Coordinates are (x, y) pairs with y growing downwards, as in a drawing: 'R'
+steps to +x and 'D' steps to +y.
+
+Example call:
+
+    >>> g = geometry("UURDDR")
+    >>> g.coordinates
+    >>> g.contacts
+    >>> g.rotated(1).conformation
+    'RRDLLD'
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from .utils import ConformationError
+
+# (x, y) step of each move.
+STEPS = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}
+
+# Move that each move becomes after a clockwise quarter turn.
+ROTATE = {"U": "R", "R": "D", "D": "L", "L": "U"}
+
+# Number of conformations whose geometry `geometry` keeps.
+GEOMETRY_CACHE_SIZE = 100000
+
+# (x, y) step of each move, indexed by the move's byte value.
+_STEP_TABLE = np.zeros((256, 2), dtype=np.int64)
+for _move, _step in STEPS.items():
+    _STEP_TABLE[ord(_move)] = _step
+
+class Geometry(object):
+    """Geometry of a conformation on the square lattice.
+
+    Parameters
+    ----------
+    conformation : str
+        Conformation according to latticemodel's conformations format (e.g. 'UDLLDRU')
+
+    Attributes
+    ----------
+    conformation : str
+        moves of the conformation.
+    length : int
+        number of sites (one more than the number of moves).
+    """
+    def __init__(self, conformation):
+        try:
+            moves = np.frombuffer(conformation.encode("ascii"), dtype=np.uint8)
+        except AttributeError:
+            raise ConformationError("""Protein conformation is None; is there a native state? """)
+        if not set(conformation) <= set(STEPS):
+            raise ConformationError("Conformation %r has moves other than %s." % (conformation, "".join(STEPS)))
+        self.conformation = conformation
+        self.length = len(conformation) + 1
+        self._moves = moves
+
+    @property
+    def coordinates(self):
+        """(x, y) coordinates of every site, with the first site at the origin."""
+        try:
+            return self._coordinates
+        except AttributeError:
+            coordinates = np.zeros((self.length, 2), dtype=np.int64)
+            np.cumsum(_STEP_TABLE[self._moves], axis=0, out=coordinates[1:])
+            coordinates.flags.writeable = False
+            self._coordinates = coordinates
+            return self._coordinates
+
+    @property
+    def bounds(self):
+        """Bounding box of the sites, as (xmin, ymin, xmax, ymax)."""
+        try:
+            return self._bounds
+        except AttributeError:
+            lower = self.coordinates.min(axis=0)
+            upper = self.coordinates.max(axis=0)
+            self._bounds = (int(lower[0]), int(lower[1]), int(upper[0]), int(upper[1]))
+            return self._bounds
+
+    @property
+    def contacts(self):
+        """Sorted tuple of (i, j) site pairs in contact, with i < j - 1."""
+        try:
+            return self._contacts
+        except AttributeError:
+            sites = {}
+            for i, xy in enumerate(map(tuple, self.coordinates.tolist())):
+                sites[xy] = i
+            pairs = []
+            # Look one step right and one step down from every site, so each
+            # neighboring pair is seen once.
+            for (x, y), i in sites.items():
+                for j in (sites.get((x + 1, y)), sites.get((x, y + 1))):
+                    if j is not None and abs(i - j) > 1:
+                        pairs.append((i, j) if i < j else (j, i))
+            pairs.sort()
+            self._contacts = tuple(pairs)
+            return self._contacts
+
+    def rotated(self, n=1):
+        """Geometry of the conformation turned clockwise by `n` quarter turns."""
+        n = n % 4
+        if n == 0:
+            return self
+        try:
+            return self._rotations[n]
+        except AttributeError:
+            self._rotations = {}
+        except KeyError:
+            pass
+        conformation = self.conformation
+        for i in range(n):
+            conformation = "".join([ROTATE[move] for move in conformation])
+        self._rotations[n] = geometry(conformation)
+        return self._rotations[n]
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return "Geometry(%r)" % self.conformation
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def geometry(conformation):
+    """Get the (cached) geometry of a conformation."""
+    return Geometry(conformation)
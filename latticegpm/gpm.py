@@ -1,9 +1,17 @@
+import numpy as np
 from latticeproteins import LatticeProteins
 
 # use space enumeration
 from gpmap.gpm import GenotypePhenotypeMap
 from gpmap.utils import mutations_to_genotypes
 
+from .thermo import ConformationIndex, LatticeThermodynamicsMatrix
+from .conformations import PackedConformations
+from .stats import stage
+from .utils import binary_sites, binary_index
+from .epistasis import epistasis_from_phenotypes, key_sites
+from .paths import count_accessible_paths, path_probability, top_paths, _positive
+
 # ------------------------------------------------------
 # Build a binary protein lattice model sequence space
 # with fitness defined by function in Jesse Blooms'
@@ -31,9 +39,43 @@ class LatticeGenotypePhenotypeMap(GenotypePhenotypeMap):
     n_conformations : int
         number of conformations that should be in space (raise error if more)
 
+    chunksize : int (optional)
+        fold genotypes in chunks of this size, so that conformation energies
+        are never held for the whole space at once. Only used when
+        `conformations` is a list of conformations.
+
+    memmap : str (optional)
+        directory to write phenotype arrays to as memory-mapped `.npy` files
+        when folding in chunks.
+
+    n_jobs : int
+        number of processes to fold genotypes in (-1 for all CPUs). Genotype
+        order is the same as a serial build. Only used when `conformations`
+        is a list of conformations.
+
+    cache : latticegpm.cache.PhenotypeCache or MemoryCache (optional)
+        cache to look up phenotypes in before folding genotypes.
+        Only used when `conformations` is a list of conformations.
+
+    strategy : str
+        'matrix' (default) or 'graycode'. 'graycode' visits the genotypes of a
+        binary map in Gray-code order and updates conformation energies one
+        site at a time. Only used when `conformations` is a list of conformations.
+        With a `cache`, 'graycode' is only used if none of the genotypes are
+        cached; otherwise the missing ones are folded with 'matrix' (with a
+        warning).
+
+    stats : latticegpm.stats.Stats (optional)
+        record folds, conformations scored, cache hits and the wall time of
+        each stage of the build (genotype enumeration, energies,
+        thermodynamics, gpmap construction) here. Also available as the
+        map's `stats` attribute.
+
     conformations : latticeproteins.conformations.Conformations object
         latticeproteins.conformations object for all conformations for
-        strings with len(wildtype)
+        strings with len(wildtype). Can also be a list of conformation strings
+        (or a ConformationIndex or conformations.PackedConformations), in which
+        case all genotypes are folded at once with `thermo.energy_matrix`.
 
     Attributes
     ----------
@@ -72,29 +114,60 @@ class LatticeGenotypePhenotypeMap(GenotypePhenotypeMap):
         target=None,
         temp=1.0,
         phenotype_type="stability",
+        chunksize=None,
+        memmap=None,
+        n_jobs=1,
+        cache=None,
+        strategy="matrix",
+        stats=None,
         **kwargs):
+        self.stats = stats
 
         # Get list of genotypes
-        genotypes = mutations_to_genotypes(wildtype, mutations)
+        with stage(stats, "genotypes"):
+            genotypes = mutations_to_genotypes(wildtype, mutations)
 
         # Calculate lattice proteins.
-        self.latticeproteins = LatticeProteins(
-            genotypes,
-            conformations=conformations,
-            target=target
-        )
+        if isinstance(conformations, (ConformationIndex, PackedConformations, list, tuple, np.ndarray)):
+            self.latticeproteins = LatticeThermodynamicsMatrix(
+                genotypes,
+                conformations,
+                temp,
+                target=target,
+                chunksize=chunksize,
+                memmap=memmap,
+                n_jobs=n_jobs,
+                cache=cache,
+                strategy=strategy,
+                stats=stats
+            )
+        else:
+            with stage(stats, "fold"):
+                self.latticeproteins = LatticeProteins(
+                    genotypes,
+                    conformations=conformations,
+                    target=target
+                )
 
-        # Get phentoype of interest.
+        # Columns of phenotypes for all genotypes; building the table is
+        # where the genotypes are folded.
         self._phenotype_type = phenotype_type
-        phenotypes = getattr(self.latticeproteins, phenotype_type)
+        with stage(stats, "fold"):
+            if isinstance(self.latticeproteins, LatticeThermodynamicsMatrix):
+                self._table = self.latticeproteins.table
+            else:
+                self._table = {}
+            # Get phentoype of interest.
+            phenotypes = self._phenotype_column(phenotype_type)
 
         # Build genotype-phenotype map.
-        super(LatticeGenotypePhenotypeMap, self).__init__(
-            wildtype,
-            genotypes,
-            phenotypes,
-            mutations=mutations
-        )
+        with stage(stats, "gpmap"):
+            super(LatticeGenotypePhenotypeMap, self).__init__(
+                wildtype,
+                genotypes,
+                phenotypes,
+                mutations=mutations
+            )
 
     @property
     def phenotype_type(self):
@@ -103,7 +176,161 @@ class LatticeGenotypePhenotypeMap(GenotypePhenotypeMap):
     @phenotype_type.setter
     def phenotype_type(self, phenotype_type):
         self._phenotype_type = phenotype_type
-        self.data['phenotypes'] = getattr(self.latticeproteins, phenotype_type)
+        # The DataFrame keeps its own copy for gpmap's methods; `phenotypes`
+        # reads the table column itself.
+        self.data['phenotypes'] = self._phenotype_column(phenotype_type)
+
+    @property
+    def phenotypes(self):
+        """Phenotypes of all genotypes. This is the `table` column of the
+        current phenotype_type itself, not a copy, so switching
+        phenotype_type doesn't copy or compute anything (see `data` for the
+        DataFrame copy).
+        """
+        return self._phenotype_column(self._phenotype_type)
+
+    @property
+    def table(self):
+        """Columns of phenotypes for all genotypes, as a dictionary of arrays.
+
+        When the map is built from a list of conformations, stability,
+        fracfolded, folded, native_conf, native_energy and log_partition_function
+        are all computed in one pass, so switching phenotype_type doesn't
+        compute anything.
+        """
+        return self._table
+
+    def _phenotype_column(self, phenotype_type):
+        """Get the array of a phenotype for all genotypes."""
+        try:
+            return self._table[phenotype_type]
+        except KeyError:
+            self._table[phenotype_type] = np.asarray(getattr(self.latticeproteins, phenotype_type))
+            return self._table[phenotype_type]
+
+    def at_temperatures(self, temperatures, phenotype_type=None):
+        """Calculate a phenotype of every genotype at many temperatures, reusing
+        the conformation energies (e.g. melting curves when phenotype_type is
+        'fracfolded').
+
+        Parameters
+        ----------
+        temperatures : array of floats
+            temperatures to calculate phenotypes at.
+        phenotype_type : str (optional)
+            'stability', 'fracfolded', 'partition_function' or
+            'log_partition_function'. Defaults to the
+            map's phenotype_type.
+
+        Returns
+        -------
+        phenotypes : 2d array of floats
+            phenotypes with shape (number of genotypes, len(temperatures)).
+        """
+        if not isinstance(self.latticeproteins, LatticeThermodynamicsMatrix):
+            raise Exception("at_temperatures requires the map to be built from a list of conformations.")
+        if phenotype_type is None:
+            phenotype_type = self.phenotype_type
+        return self.latticeproteins.at_temperatures(temperatures,
+            phenotype_type=phenotype_type)
+
+    def hypercube(self):
+        """Lay the phenotypes of a complete binary map out on its hypercube.
+
+        Returns
+        -------
+        sites : list of ints
+            mutated sites, in order.
+        phenotypes : array of floats
+            phenotypes of all 2^n genotypes, indexed by their binary strings
+            (see `utils.binary_index`).
+        """
+        sites, mutants = binary_sites(self.wildtype, self.mutations)
+        positions = binary_index(self.genotypes, self.wildtype, sites)
+        size = 1 << len(sites)
+        if len(positions) != size or np.bincount(positions, minlength=size).max() != 1:
+            raise Exception("The map must hold every genotype of a binary space exactly once.")
+        phenotypes = np.empty(size, dtype=float)
+        phenotypes[positions] = self.phenotypes
+        return sites, phenotypes
+
+    def epistasis(self, encoding="hadamard", order=None):
+        """Calculate every epistatic coefficient of a complete binary map
+        with a fast Walsh-Hadamard transform, in O(n * 2^n) time.
+
+        Parameters
+        ----------
+        encoding : str
+            'hadamard' for background-averaged coefficients (sites encoded
+            as +1 for wildtype, -1 for mutant), or 'local' for biochemical
+            coefficients relative to the wildtype.
+        order : int (optional)
+            highest order of coefficients to return. Defaults to all orders.
+
+        Returns
+        -------
+        sites : list of tuples
+            mutated sites of each coefficient, sorted by order; () is the
+            zeroth-order term.
+        coefficients : array of floats
+            value of each coefficient.
+        """
+        sites, phenotypes = self.hypercube()
+        keys, coefficients = epistasis_from_phenotypes(phenotypes, encoding=encoding, order=order)
+        return key_sites(keys, sites), coefficients
+
+    def accessible_paths(self, population_size=1000, top=None):
+        """Count and weight the forward paths from wildtype to mutant along
+        which the phenotype increases at every step, by dynamic programming
+        over the hypercube in O(n * 2^n) time.
+
+        Phenotypes are taken as fitness, so they must be positive and higher
+        must be fitter (e.g. phenotype_type='fracfolded'). Maps whose
+        phenotype_type is 'stability' or 'native_energy', where lower is
+        fitter, raise an error.
+
+        Parameters
+        ----------
+        population_size : int
+            effective population size of the SSWM walk that weights paths.
+        top : int (optional)
+            also return the `top` most probable paths.
+
+        Returns
+        -------
+        n_paths : int
+            number of accessible paths.
+        probability : float
+            probability that an SSWM walk from the wildtype reaches the mutant.
+        paths : list of lists of str
+            genotypes along each of the most probable paths (only if `top`
+            is given).
+        probabilities : array of floats
+            probability of each of those paths (only if `top` is given).
+        """
+        if self.phenotype_type in ("stability", "native_energy"):
+            raise Exception("Lower %s is fitter; set phenotype_type to a fitness such as "
+                "'fracfolded' first." % self.phenotype_type)
+        sites, fitness = self.hypercube()
+        fitness = _positive(fitness)
+        n_paths = count_accessible_paths(fitness)
+        probability = path_probability(fitness, population_size=population_size)
+        if top is None:
+            return n_paths, probability
+        positions, probabilities = top_paths(fitness, top, population_size=population_size)
+        sites, mutants = binary_sites(self.wildtype, self.mutations)
+        n = len(sites)
+        paths = []
+        for path in positions:
+            genotypes = []
+            for position in path:
+                genotype = list(self.wildtype)
+                for k in range(n):
+                    if position >> (n - 1 - k) & 1:
+                        genotype[sites[k]] = mutants[k]
+                genotypes.append("".join(genotype))
+            paths.append(genotypes)
+        return n_paths, probability, paths, probabilities
 
     def print_sequences(self, sequences):
         """ Print sequence conformation with/without ligand bound. """
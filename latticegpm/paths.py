@@ -0,0 +1,179 @@
+__doc__ = """
+
+Accessible mutational paths across complete binary genotype-phenotype maps.
+
+A forward path goes from the wildtype (position 0 of the hypercube, see
+`utils.binary_index`) to the full mutant (position 2^n - 1), adding one
+mutation per step. It is accessible when fitness increases at every step.
+Instead of enumerating the n! orderings of mutations, paths are counted and
+weighted by dynamic programming over the hypercube, one layer (number of
+mutations) at a time, in O(n * 2^n) time.
+
+Path probabilities follow a strong-selection/weak-mutation (SSWM) walk: from
+each genotype, the walk steps to a fitter forward neighbor with probability
+proportional to that mutation's Kimura fixation probability, and stops if
+there is none. Selection coefficients are relative fitness differences, so
+fitness must be positive (e.g. fraction folded, not stability).
+
+Example call:
+
+    >>> n_paths = count_accessible_paths(fitness)
+    >>> probability = path_probability(fitness, population_size=1000)
+    >>> paths, probabilities = top_paths(fitness, 10, population_size=1000)
+
+"""
+
+import numpy as np
+
+from .epistasis import coefficient_orders, _n_sites
+from .simulate import fixation_probability
+
+# Above this many sites, n! no longer fits in an int64, and path counts are floats.
+MAX_EXACT_SITES = 20
+
+def count_accessible_paths(fitness):
+    """Count the forward paths from wildtype to mutant along which fitness
+    strictly increases at every step.
+
+    Parameters
+    ----------
+    fitness : array of floats
+        fitness of all 2^n genotypes, indexed by their binary strings.
+
+    Returns
+    -------
+    n_paths : int
+        number of accessible paths (a float past `MAX_EXACT_SITES` sites).
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n = _n_sites(fitness)
+    counts = np.zeros(len(fitness), dtype=np.int64 if n <= MAX_EXACT_SITES else float)
+    counts[0] = 1
+    for genotypes in _layers(n):
+        for bit in _bits(n):
+            targets = genotypes[genotypes & bit != 0]
+            sources = targets ^ bit
+            uphill = fitness[targets] > fitness[sources]
+            counts[targets[uphill]] += counts[sources[uphill]]
+    return counts[-1].item()
+
+def step_probabilities(fitness, population_size=1000):
+    """Probability that an SSWM walk takes each forward step.
+
+    Parameters
+    ----------
+    fitness : array of floats
+        positive fitness of all 2^n genotypes, indexed by their binary strings.
+    population_size : int
+        effective population size in the fixation probability.
+
+    Returns
+    -------
+    probabilities : 2d array of floats
+        probabilities[g, k] is the probability of stepping from genotype g to
+        g with bit k set; 0 if bit k is already set or the step isn't
+        beneficial.
+    """
+    fitness = _positive(fitness)
+    n = _n_sites(fitness)
+    genotypes = np.arange(len(fitness))
+    probabilities = np.zeros((len(fitness), n), dtype=float)
+    for k, bit in enumerate(_bits(n)):
+        sources = genotypes[genotypes & bit == 0]
+        targets = sources | bit
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = fitness[targets] / fitness[sources] - 1
+        uphill = fitness[targets] > fitness[sources]
+        probabilities[sources, k] = np.where(uphill, fixation_probability(s, population_size), 0.0)
+    total = probabilities.sum(axis=1)
+    np.divide(probabilities, total[:, None], out=probabilities, where=total[:, None] > 0)
+    return probabilities
+
+def path_probability(fitness, population_size=1000):
+    """Probability that an SSWM walk from the wildtype reaches the full
+    mutant, i.e. the summed probability of all accessible paths.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n = _n_sites(fitness)
+    steps = step_probabilities(fitness, population_size)
+    reached = np.zeros(len(fitness), dtype=float)
+    reached[0] = 1.0
+    for genotypes in _layers(n):
+        for k, bit in enumerate(_bits(n)):
+            targets = genotypes[genotypes & bit != 0]
+            sources = targets ^ bit
+            reached[targets] += reached[sources] * steps[sources, k]
+    return reached[-1].item()
+
+def top_paths(fitness, k=10, population_size=1000):
+    """Find the `k` most probable accessible paths of an SSWM walk, keeping
+    the `k` best partial paths into every genotype.
+
+    Returns
+    -------
+    paths : list of lists of ints
+        hypercube positions along each path, from 0 to 2^n - 1, most
+        probable first. Fewer than `k` if there are fewer accessible paths.
+    probabilities : array of floats
+        probability of each path.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n = _n_sites(fitness)
+    steps = step_probabilities(fitness, population_size)
+    with np.errstate(divide="ignore"):
+        log_steps = np.log(steps)
+    # Log-probability of the k best partial paths into each genotype, with
+    # the bit and rank they came from.
+    best = np.full((len(fitness), k), -np.inf)
+    from_bit = np.full((len(fitness), k), -1, dtype=np.int8)
+    from_rank = np.zeros((len(fitness), k), dtype=np.int32)
+    best[0, 0] = 0.0
+    for genotypes in _layers(n):
+        for b, bit in enumerate(_bits(n)):
+            targets = genotypes[genotypes & bit != 0]
+            sources = targets ^ bit
+            candidates = best[sources] + log_steps[sources, b][:, None]
+            # Skip genotypes this step can't reach (columns are sorted).
+            live = candidates[:, 0] > -np.inf
+            targets, candidates = targets[live], candidates[live]
+            merged = np.concatenate([best[targets], candidates], axis=1)
+            order = np.argsort(-merged, axis=1, kind="stable")[:, :k]
+            rows = np.arange(len(targets))[:, None]
+            # Columns past k are the new candidates; the rest are kept.
+            new = order >= k
+            kept = np.minimum(order, k - 1)
+            best[targets] = merged[rows, order]
+            from_bit[targets] = np.where(new, b, from_bit[targets][rows, kept])
+            from_rank[targets] = np.where(new, order - k, from_rank[targets][rows, kept])
+    paths, probabilities = [], []
+    for rank in range(k):
+        if best[-1, rank] == -np.inf:
+            break
+        probabilities.append(np.exp(best[-1, rank]))
+        path = [len(fitness) - 1]
+        r = rank
+        while path[-1] != 0:
+            g = path[-1]
+            b = int(from_bit[g, r])
+            r = int(from_rank[g, r])
+            path.append(g ^ (1 << (n - 1 - b)))
+        paths.append(path[::-1])
+    return paths, np.array(probabilities)
+
+def _positive(fitness):
+    """Get fitness as an array of floats; raise an error if any value isn't positive."""
+    fitness = np.asarray(fitness, dtype=float)
+    if not np.all(fitness > 0):
+        raise Exception("Fitness must be positive to compute selection coefficients.")
+    return fitness
+
+def _bits(n):
+    """Bit of each of n sites, with site k at bit n-1-k."""
+    return [1 << (n - 1 - k) for k in range(n)]
+
+def _layers(n):
+    """Positions of the genotypes with 1, 2, ..., n mutations."""
+    orders = coefficient_orders(n)
+    order = np.argsort(orders, kind="stable")
+    bounds = np.searchsorted(orders[order], np.arange(1, n + 2))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n)]
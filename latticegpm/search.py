@@ -1,119 +1,186 @@
 import os
-import random
+import multiprocessing
 import numpy as np
 
 from latticeproteins.interactions import miyazawa_jernigan
-from latticeproteins.sequences import random_sequence, n_mutants
-from latticeproteins.conformations import Conformations
 
-from .thermo import LatticeThermodynamics
-from gpmap.utils import hamming_distance
-from gpmap.utils import AMINO_ACIDS
+from .thermo import (LatticeThermodynamics,
+    LatticeThermodynamicsMatrix,
+    ConformationIndex,
+    interaction_matrix,
+    encode_sequence)
+from .conformations import enumerate_conformations, save_conformations, load_conformations
 
+# Amino acids to mutate to, in gpmap.utils.AMINO_ACIDS order (gpmap isn't
+# imported here, since it loads pandas).
+AMINO_ACIDS = ['D', 'T', 'S', 'E', 'P', 'G', 'A', 'C', 'V', 'M',
+    'I', 'L', 'Y', 'F', 'H', 'K', 'R', 'W', 'Q', 'N']
 
-def get_lowest_confs(seq, k, database, temperature=1.0):
+
+def conformation_index(length, conformations=None):
+    """Get a ConformationIndex of all conformations of sequences with `length` residues.
+
+    Parameters
+    ----------
+    length : int
+        length of the sequences.
+    conformations : ConformationIndex, list of str or str (optional)
+        conformations to use. A string is the path of a conformation store
+        (see `conformations.save_conformations`); if it doesn't exist yet,
+        the conformations are enumerated and saved there. If None, the
+        conformations are enumerated.
+    """
+    if isinstance(conformations, ConformationIndex):
+        index = conformations
+    elif conformations is None:
+        index = enumerate_conformations(length)
+    elif isinstance(conformations, str):
+        if not os.path.exists(os.path.join(conformations, "header.json")):
+            save_conformations(conformations, enumerate_conformations(length))
+        index = load_conformations(conformations)
+    else:
+        index = ConformationIndex(conformations)
+    if index.length != length:
+        raise Exception("conformations must be for sequences of length %d." % length)
+    return index
+
+def get_lowest_confs(seq, k, conformations=None, interaction_energies=miyazawa_jernigan):
     """Get the `k` lowest conformations in the sequence's conformational ensemble.
+
+    Every conformation is scored in one pass, and the `k` lowest are picked
+    with a partial sort. Conformations with identical contacts have identical
+    energies; pass `index.compress()` to only get one of each.
+
+    Parameters
+    ----------
+    seq : str or list of str
+        sequence, or list of sequences with the same length.
+    k : int
+        number of conformations to get.
+    conformations : ConformationIndex, list of str or str (optional)
+        conformations to search; see `conformation_index`.
+    interaction_energies : dict
+        mapping of two-letter contacts to their energies.
+
+    Returns
+    -------
+    states : array of str
+        the `k` lowest conformations, from lowest to highest energy. A
+        (n_sequences, k) array if `seq` is a list of sequences.
     """
-    length = len(seq)
-    c = Conformations(length, database)
-    dGdependence = "fracfolded"
-
-    # Calculate the kth lowest conformations
-    ncontacts = c.MaxContacts()
-    confs = np.array(c.UniqueConformations(ncontacts))
-    energies = np.empty(len(confs), dtype=float)
-    for i, conf in enumerate(confs):
-        output = c.FoldSequence(seq, 1.0, target_conf=str(conf))
-        energies[i] = output[0]
-
-    sorted_e = np.argsort(energies)
-    states = confs[sorted_e[0:k]]
+    single = isinstance(seq, str)
+    sequences = [seq] if single else list(seq)
+    index = conformation_index(len(sequences[0]), conformations)
+    k = min(k, len(index))
+    energies = index.energy_matrix(sequences, interaction_energies=interaction_energies)
+    # Partially sort to get the k lowest, then sort those (ties by position).
+    lowest = np.argpartition(energies, k - 1, axis=1)[:, :k]
+    order = np.lexsort((lowest, np.take_along_axis(energies, lowest, axis=1)))
+    lowest = np.take_along_axis(lowest, order, axis=1)
+    states = np.array([[index.conf_list[i] for i in row] for row in lowest])
+    if single:
+        return states[0]
     return states
 
-def adaptive_walk(lattice, n_mutations):
+def adaptive_walk(lattice, n_mutations, rule="greedy", amino_acids=AMINO_ACIDS, seed=None):
     """Given a lattice object, adaptive walk to a sequence n_mutations away.
-    Only works for <10 conformations in the landscapes!!!
+
+    At each step, every single mutant at the sites that haven't been mutated
+    yet is scored in one batch (`LatticeThermodynamics.scan_mutants`). A step
+    is taken to one of the mutants that increase fracfolded and keep the
+    native conformation of the starting sequence.
+
+    Parameters
+    ----------
+    lattice : LatticeThermodynamics
+        starting sequence.
+    n_mutations : int
+        number of steps to take.
+    rule : str
+        how to pick a step among the uphill mutants: 'greedy' takes the
+        fittest, 'random' picks one uniformly, and 'proportional' picks one
+        with probability proportional to its fracfolded.
+    amino_acids : list of str
+        amino acids to mutate each site to.
+    seed : int (optional)
+        seed for the random steps.
+
+    Returns
+    -------
+    path : list of LatticeThermodynamics
+        every sequence on the walk, starting with `lattice`.
     """
     # Sanity check
     if type(lattice) != LatticeThermodynamics:
         raise TypeError("lattice must be a LatticeThermodynamics object")
-    elif len(lattice.conf_list) > 10:
-        raise Exception("too many conformations to compute in a reasonable time.")
-
-    wildtype = lattice.sequence
-    mutant = list(wildtype)
-
-    hamming = 0
-    indices = list(range(len(wildtype)))
-    fracfolded = lattice.fracfolded
-    failed = 0
-    while hamming < n_mutations and failed < 100:
-        # Select a site to mutate
-        mut = mutant[:]
-        index = random.choice(indices)
-
-        # Choose a mutation
-        mutation = random.choice(AMINO_ACIDS)
-        mut[index] = mutation
-
-        # New lattice
-        mlattice = LatticeThermodynamics(
-            "".join(mut),
-            lattice.conf_list,
-            lattice.temperature,
-            interaction_energies=lattice.interaction_energies)
-
-        if mlattice.fracfolded > fracfolded and mlattice.native_conf == lattice.native_conf:
-            indices.remove(index)
-            mutant[index] = mutation
-            hamming = hamming_distance(wildtype, mutant)
-            fracfolded = mlattice.fracfolded
+    if rule not in ("greedy", "random", "proportional"):
+        raise Exception("rule must be 'greedy', 'random' or 'proportional'.")
+    rng = np.random.RandomState(seed)
+    amino_acids = list(amino_acids)
+
+    # Column of the native conformation, or -1 if it doesn't fold.
+    native = -1
+    if lattice.native_conf is not None:
+        try:
+            native = lattice.conf_index.find(lattice.native_conf)
+        except ValueError:
+            pass
+
+    path = [lattice]
+    current = lattice
+    indices = list(range(len(lattice.sequence)))
+    while len(path) <= n_mutations:
+        table = current.scan_mutants(amino_acids=amino_acids, sites=indices)
+        fracfolded = table["fracfolded"]
+        uphill = (fracfolded > current.fracfolded) & (table["native_conf"] == native)
+        if not uphill.any():
+            raise Exception("No adaptive paths n_mutations away.")
+        rows, columns = np.where(uphill)
+        if rule == "greedy":
+            choice = np.argmax(fracfolded[rows, columns])
+        elif rule == "random":
+            choice = rng.randint(len(rows))
         else:
-            failed += 1
+            weights = fracfolded[rows, columns]
+            choice = rng.choice(len(rows), p=weights / weights.sum())
+        site = indices.pop(rows[choice])
+        current = current.mutate(site, amino_acids[columns[choice]])
+        path.append(current)
+    return path
 
-    if failed == 100:
-        raise Exception("No adaptive paths n_mutations away.")
+def adaptive_walk2(seq, n_mutations, temp=1.0, target=None, conformations=None,
+    interaction_energies=miyazawa_jernigan, cache=None):
+    """Greedy adaptive walk from a sequence, taking the fittest single
+    mutant at every step.
 
-    return mlattice
+    Parameters
+    ----------
+    seq : str
+        starting sequence.
+    n_mutations : int
+        number of steps to take.
+    temp : float
+        temperature.
+    target : str (optional)
+        target conformation.
+    conformations : ConformationIndex, list of str or str (optional)
+        conformations to fold into; see `conformation_index`.
+    cache : cache.MemoryCache or cache.PhenotypeCache (optional)
+        cache to look up the energies of `seq` and the phenotypes of its
+        mutants in.
 
-def adaptive_walk2(seq, n_mutations, temp=1.0, target=None):
-    """
+    Returns
+    -------
+    path : list of str
+        every sequence on the walk, starting with `seq`.
     """
-    length = len(seq)
-    c = Conformations(length, database)
-    dGdependence = "fracfolded"
-
-    wildtype = seq
-    mutant = list(wildtype)
-
-    hamming = 0
-    indices = list(range(len(wildtype)))
-    fracfolded = lattice.fracfolded
-    attempts = 0
-
-    path = []
-
-    fitness = Fitness(temp, c, dGdependence=dGdependence, targets=target)
-    while hamming < n_mutations and attempts < 100:
-        # Calculate stability of all amino acids at all sites
-        AA_grid = np.array([AMINO_ACIDS]*length)
-        dG = np.zeros(AA_grid.shape, dtype=float)
-        for (i,j), AA in np.ndenumerate(AA_grid):
-            seq1 = mutant[:]
-            seq1[i] = AA_grid[i,j]
-            fitness.Fitness(seq1)
-
-        x, y = np.where(dG = dG.max)
-        best_AA = AA_grid[x[0], y[0]]
-        mutant[x[0]] = best_AA
-        path.append(mutant)
-        hamming = hamming_distance(wildtype, mutant)
-        attempts += 0
-
-    if failed == 100:
-        raise Exception("No adaptive paths n_mutations away.")
-
-    return path
+    index = conformation_index(len(seq), conformations)
+    lattice = LatticeThermodynamics(seq, index, temp,
+        interaction_energies=interaction_energies,
+        target=target,
+        cache=cache)
+    path = adaptive_walk(lattice, n_mutations, rule="greedy")
+    return ["".join(step.sequence) for step in path]
 
 
 def sequence_space(length, temperature=1.0, threshold=0.0,
@@ -121,68 +188,133 @@ def sequence_space(length, temperature=1.0, threshold=0.0,
     differby=None,
     max_iter=1000,
     interaction_energies=miyazawa_jernigan,
-    dGdependence="fracfolded"):
+    conformations=None,
+    batchsize=1000,
+    n_jobs=1,
+    seed=None,
+    cache=None):
     """Randomly search sequence space for two sequences that
     fold with stability below some threshold and differ at a given number of sites.
 
+    Random sequences are drawn and folded in batches. Once a first sequence
+    passes `threshold`, random mutants of it at exactly `differby` sites are
+    drawn and folded the same way, until one of them passes too. Batches can
+    be spread across processes; each batch draws from its own random stream,
+    so the result only depends on `seed` and `batchsize`.
+
     Parameters
     ----------
-    Conformations : latticeproteins.conformations.Conformations object
-        object that holds all the possible conformations to search.
+    length : int
+        length of the sequences.
     temperature : float
         Temperature parameter (ratio to kT)
     threshold : float
         Maximum allowed stability for landscape
+    target_conf : str (optional)
+        target conformation.
+    differby : int (optional)
+        number of sites the sequences differ at. Defaults to `length`.
+    max_iter : int
+        maximum number of sequences to draw when looking for each sequence,
+        rounded up to a whole number of batches.
+    conformations : ConformationIndex, list of str or str (optional)
+        conformations to fold into; see `conformation_index`.
+    batchsize : int
+        number of sequences to draw and fold at a time.
+    n_jobs : int
+        number of processes to fold batches in (-1 for all CPUs).
+    seed : int (optional)
+        seed for the random sequences.
+    cache : cache.MemoryCache or cache.PhenotypeCache (optional)
+        cache to look up the phenotypes of drawn sequences in. Only used when
+        n_jobs is 1, since worker processes can't share it.
 
     Returns
     -------
     sequences : list of two strings
-        List of two sequences that differ at all sites and fold.
+        List of two sequences that differ at `differby` sites and fold.
     """
-    # Make a conformations database.
-    database_dir = "database/"
-    if not os.path.exists(database_dir):
-        os.makedirs(database_dir)
-
     # Check differby
     if differby is None:
         differby = length
     elif differby > length:
         raise Exception("differby cannot be larger than the length of the sequences.")
-
-    # Construct conformations database.
-    conformations = Conformations(length, database_dir, interaction_energies=miyazawa_jernigan)
-
-    # Set the fitness.
-    fitness = Fitness(temperature, conformations,
-        dGdependence=dGdependence,
-        targets=target_conf)
-
-    # Find a sequence that's below a certain energy.
-    energy = threshold
-    counter = -1
-    while energy >= threshold:
-        sequence = RandomSequence(length)
-        energy = fitness.Stability(sequence)
-        # Check looping
-        if counter >= max_iter:
-            raise Exception("Reached max iteration in search.")
-
-    # Set the resulting sequence as the first variable
-    sequence1 = ''.join(sequence)
-    energy = threshold # Reset energy
-
-    # Search for next function
-    counter = -1
-    mutants = NMutants(sequence1, differby, max_iter)
-    while energy >= threshold:
-        counter += 1
-        sequence = RandomSequence(length)
-        energy = fitness.Stability(sequence)
-        # Check looping
-        if counter >= max_iter:
-            raise Exception("Reached max iteration in search.")
-
-    # Set second sequence
-    sequence2 = ''.join(mutants[counter])
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+
+    index = conformation_index(length, conformations)
+    n_batches = -(-max_iter // batchsize)
+    streams = np.random.SeedSequence(seed).spawn(2 * n_batches)
+    data = (index, temperature, interaction_energies, target_conf, threshold)
+    if n_jobs > 1:
+        pool = multiprocessing.Pool(n_jobs, initializer=_init_sampler, initargs=data)
+    else:
+        pool = None
+        _init_sampler(*data, cache=cache)
+    try:
+        # Find a sequence that's below the threshold.
+        tasks = [(None, 0, batchsize, stream) for stream in streams[:n_batches]]
+        sequence1 = _first_sample(tasks, pool)
+        # Search for a mutant of it that's also below the threshold.
+        tasks = [(sequence1, differby, batchsize, stream) for stream in streams[n_batches:]]
+        sequence2 = _first_sample(tasks, pool)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
     return sequence1, sequence2
+
+# Conformations and search parameters shared by every batch a process folds.
+_sampler_data = {}
+
+def _init_sampler(conf_index, temperature, interaction_energies, target, threshold, cache=None):
+    """Store the data shared by all batches in a process."""
+    _sampler_data["conf_index"] = conf_index
+    _sampler_data["temperature"] = temperature
+    _sampler_data["interaction_energies"] = interaction_energies
+    _sampler_data["target"] = target
+    _sampler_data["threshold"] = threshold
+    _sampler_data["cache"] = cache
+
+def _first_sample(tasks, pool):
+    """Get the first passing sequence from a list of batches, in order."""
+    if pool is None:
+        results = (_sample_batch(task) for task in tasks)
+    else:
+        results = pool.imap(_sample_batch, tasks)
+    for sequence in results:
+        if sequence is not None:
+            return sequence
+    raise Exception("Reached max iteration in search.")
+
+def _sample_batch(task):
+    """Draw and fold a batch of random sequences, or of random mutants of a
+    sequence at `differby` sites, and get the first one below the threshold
+    (None if none are).
+    """
+    parent, differby, batchsize, stream = task
+    interaction_energies = _sampler_data["interaction_energies"]
+    alphabet = interaction_matrix(interaction_energies)[0]
+    letters = np.array(sorted(alphabet, key=alphabet.get))
+    length = _sampler_data["conf_index"].length
+    rng = np.random.Generator(np.random.PCG64(stream))
+    if parent is None:
+        codes = rng.integers(len(letters), size=(batchsize, length))
+    else:
+        # Shift `differby` random sites of each mutant to another amino acid.
+        codes = np.tile(encode_sequence(parent, alphabet), (batchsize, 1))
+        sites = np.argsort(rng.random((batchsize, length)), axis=1)[:, :differby]
+        shifts = rng.integers(1, len(letters), size=(batchsize, differby))
+        rows = np.arange(batchsize)[:, None]
+        codes[rows, sites] = (codes[rows, sites] + shifts) % len(letters)
+    sequences = ["".join(row) for row in letters[codes]]
+    lattice = LatticeThermodynamicsMatrix(sequences,
+        _sampler_data["conf_index"],
+        _sampler_data["temperature"],
+        interaction_energies=interaction_energies,
+        target=_sampler_data["target"],
+        cache=_sampler_data["cache"])
+    passing = np.where(np.asarray(lattice.stability) < _sampler_data["threshold"])[0]
+    if len(passing) == 0:
+        return None
+    return sequences[passing[0]]
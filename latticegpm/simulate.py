@@ -0,0 +1,275 @@
+__doc__ = """
+
+Simulate the evolution of many replicate populations on a lattice protein
+landscape.
+
+Genotypes are held as integer arrays of amino acid indices (see
+`thermo.interaction_matrix`), and the mutants proposed by every replicate in a
+generation are folded together in one batch. Fitness is the fraction folded.
+
+Every replicate draws its random numbers from its own stream, spawned from
+`seed`, so a replicate's trajectory doesn't depend on how many replicates are
+run or how they are split across processes.
+
+Example call:
+
+    >>> index = enumerate_conformations(len(wildtype))
+    >>> genotypes, fitness = sswm(wildtype, index, 100, n_replicates=1000, seed=1)
+    >>> population, mean_fitness = wright_fisher(wildtype, index, 100,
+    ...     population_size=100, mutation_rate=0.01, n_replicates=100, seed=1)
+
+"""
+
+import multiprocessing
+import numpy as np
+
+from latticeproteins.interactions import miyazawa_jernigan
+
+from .thermo import (ConformationIndex,
+    LatticeThermodynamicsMatrix,
+    interaction_matrix,
+    encode_sequence)
+
+class Landscape(object):
+    """Fitness (fraction folded) of integer-encoded genotypes.
+
+    Parameters
+    ----------
+    conformations : list of str or ConformationIndex
+        conformations to fold genotypes into.
+    temperature : float
+        temperature.
+    interaction_energies : dict
+        mapping of two-letter contacts to their energies.
+    target : str (optional)
+        target conformation.
+    chunksize : int (optional)
+        fold genotypes in chunks of this size; see `LatticeThermodynamicsMatrix`.
+
+    Attributes
+    ----------
+    letters : array of str
+        amino acid of each index in a genotype.
+    """
+    def __init__(self, conformations, temperature=1.0, interaction_energies=miyazawa_jernigan,
+        target=None, chunksize=None):
+        if not isinstance(conformations, ConformationIndex):
+            conformations = ConformationIndex(conformations)
+        self.conf_index = conformations
+        self.temperature = temperature
+        self.interaction_energies = interaction_energies
+        self.target = target
+        self.chunksize = chunksize
+        alphabet = interaction_matrix(interaction_energies)[0]
+        self.alphabet = alphabet
+        self.letters = np.array(sorted(alphabet, key=alphabet.get))
+
+    def encode(self, sequence):
+        """Convert a sequence into a genotype."""
+        return encode_sequence(sequence, self.alphabet)
+
+    def decode(self, genotypes):
+        """Convert a genotype, or an array of genotypes, into sequences."""
+        genotypes = np.asarray(genotypes)
+        if genotypes.ndim == 1:
+            return "".join(self.letters[genotypes])
+        return ["".join(row) for row in self.letters[genotypes.reshape(-1, genotypes.shape[-1])]]
+
+    def fitness(self, genotypes):
+        """Calculate the fitness of a 2d array of genotypes in one batch.
+
+        Identical genotypes are only folded once.
+        """
+        genotypes = np.asarray(genotypes)
+        unique, inverse = np.unique(genotypes, axis=0, return_inverse=True)
+        lattice = LatticeThermodynamicsMatrix(self.decode(unique),
+            self.conf_index,
+            self.temperature,
+            interaction_energies=self.interaction_energies,
+            target=self.target,
+            chunksize=self.chunksize)
+        return np.asarray(lattice.fracfolded)[inverse.ravel()]
+
+def fixation_probability(s, population_size):
+    """Kimura's probability that a mutation with selection coefficient `s`
+    fixes in a population of `population_size`.
+    """
+    s = np.asarray(s, dtype=float)
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        probability = np.expm1(-2 * s) / np.expm1(-2 * population_size * s)
+    # Neutral mutations fix with probability 1/N.
+    probability = np.where(s == 0, 1.0 / population_size, probability)
+    return np.nan_to_num(probability, nan=0.0)
+
+def sswm(wildtype, conformations, n_generations, temperature=1.0, population_size=1000,
+    n_replicates=1, seed=None, interaction_energies=miyazawa_jernigan, target=None,
+    chunksize=None, n_jobs=1):
+    """Evolve replicates under strong-selection/weak-mutation dynamics.
+
+    Each generation, every replicate proposes a random single mutant, and it
+    fixes with Kimura's fixation probability given its selection
+    coefficient. All proposed mutants are folded in one batch.
+
+    Parameters
+    ----------
+    wildtype : str
+        starting sequence of every replicate.
+    conformations : list of str or ConformationIndex
+        conformations to fold genotypes into.
+    n_generations : int
+        number of generations.
+    temperature : float
+        temperature.
+    population_size : int
+        effective population size.
+    n_replicates : int
+        number of replicate trajectories.
+    seed : int (optional)
+        seed for the replicates' random number streams.
+    n_jobs : int
+        number of processes to split the replicates across (-1 for all CPUs).
+
+    Returns
+    -------
+    genotypes : 3d array of ints
+        genotype of each replicate, with shape (n_generations + 1,
+        n_replicates, length). Use `Landscape.decode` to get sequences.
+    fitness : 2d array of floats
+        fitness of each replicate, with shape (n_generations + 1, n_replicates).
+    """
+    landscape = Landscape(conformations, temperature,
+        interaction_energies=interaction_energies,
+        target=target,
+        chunksize=chunksize)
+    return _run(_sswm, landscape, wildtype, n_replicates, seed, n_jobs,
+        (n_generations, population_size))
+
+def wright_fisher(wildtype, conformations, n_generations, temperature=1.0, population_size=100,
+    mutation_rate=0.01, n_replicates=1, seed=None, interaction_energies=miyazawa_jernigan,
+    target=None, chunksize=None, n_jobs=1):
+    """Evolve replicate populations under Wright-Fisher dynamics.
+
+    Each generation, every site of every individual mutates with probability
+    `mutation_rate`, and the next generation is drawn from the mutated one
+    in proportion to fitness (uniformly, if every individual of a replicate
+    has zero fitness). All individuals of all replicates are folded in one
+    batch.
+
+    Parameters
+    ----------
+    wildtype : str
+        starting sequence of every individual.
+    conformations : list of str or ConformationIndex
+        conformations to fold genotypes into.
+    n_generations : int
+        number of generations.
+    temperature : float
+        temperature.
+    population_size : int
+        number of individuals in each replicate population.
+    mutation_rate : float
+        probability that a site mutates in one generation.
+    n_replicates : int
+        number of replicate populations.
+    seed : int (optional)
+        seed for the replicates' random number streams.
+    n_jobs : int
+        number of processes to split the replicates across (-1 for all CPUs).
+
+    Returns
+    -------
+    population : 3d array of ints
+        final genotypes, with shape (n_replicates, population_size, length).
+    mean_fitness : 2d array of floats
+        mean fitness of each population, with shape (n_generations + 1,
+        n_replicates).
+    """
+    landscape = Landscape(conformations, temperature,
+        interaction_energies=interaction_energies,
+        target=target,
+        chunksize=chunksize)
+    return _run(_wright_fisher, landscape, wildtype, n_replicates, seed, n_jobs,
+        (n_generations, population_size, mutation_rate))
+
+def _run(simulation, landscape, wildtype, n_replicates, seed, n_jobs, args):
+    """Run a simulation on groups of replicates, in processes if n_jobs > 1,
+    and join the groups in order.
+    """
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+    streams = np.random.SeedSequence(seed).spawn(n_replicates)
+    n_groups = max(1, min(n_jobs, n_replicates))
+    groups = [list(group) for group in np.array_split(np.arange(n_replicates), n_groups)]
+    tasks = [(simulation, landscape, wildtype, [streams[i] for i in group], args) for group in groups]
+    if n_jobs > 1:
+        pool = multiprocessing.Pool(n_groups)
+        try:
+            results = pool.map(_run_group, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_run_group(task) for task in tasks]
+    # Replicates are on axis 1 of the trajectories, and axis 0 of populations.
+    first, second = zip(*results)
+    axis = 0 if simulation is _wright_fisher else 1
+    return np.concatenate(first, axis=axis), np.concatenate(second, axis=1)
+
+def _run_group(task):
+    """Run a simulation on one group of replicates."""
+    simulation, landscape, wildtype, streams, args = task
+    rngs = [np.random.Generator(np.random.PCG64(stream)) for stream in streams]
+    return simulation(landscape, landscape.encode(wildtype), rngs, *args)
+
+def _sswm(landscape, wildtype, rngs, n_generations, population_size):
+    """Strong-selection/weak-mutation trajectories of one group of replicates."""
+    n_replicates, length = len(rngs), len(wildtype)
+    n_letters = len(landscape.letters)
+    genotypes = np.empty((n_generations + 1, n_replicates, length), dtype=np.uint8)
+    fitness = np.empty((n_generations + 1, n_replicates), dtype=float)
+    genotypes[0] = wildtype
+    fitness[0] = landscape.fitness(wildtype[None, :])[0]
+    replicates = np.arange(n_replicates)
+    for generation in range(1, n_generations + 1):
+        current = genotypes[generation - 1]
+        # Each replicate draws its site, amino acid and fixation roll.
+        draws = np.array([(rng.integers(length), rng.integers(1, n_letters), rng.random())
+            for rng in rngs])
+        sites = draws[:, 0].astype(int)
+        shifts = draws[:, 1].astype(int)
+        mutants = current.copy()
+        mutants[replicates, sites] = (current[replicates, sites] + shifts) % n_letters
+        mutant_fitness = landscape.fitness(mutants)
+        s = mutant_fitness / fitness[generation - 1] - 1
+        fixed = draws[:, 2] < fixation_probability(s, population_size)
+        genotypes[generation] = np.where(fixed[:, None], mutants, current)
+        fitness[generation] = np.where(fixed, mutant_fitness, fitness[generation - 1])
+    return genotypes, fitness
+
+def _wright_fisher(landscape, wildtype, rngs, n_generations, population_size, mutation_rate):
+    """Wright-Fisher populations of one group of replicates."""
+    n_replicates, length = len(rngs), len(wildtype)
+    n_letters = len(landscape.letters)
+    shape = (population_size, length)
+    population = np.empty((n_replicates,) + shape, dtype=np.uint8)
+    population[:] = wildtype
+    mean_fitness = np.empty((n_generations + 1, n_replicates), dtype=float)
+    fitness = landscape.fitness(population.reshape(-1, length)).reshape(n_replicates, population_size)
+    mean_fitness[0] = fitness.mean(axis=1)
+    for generation in range(1, n_generations + 1):
+        # Mutate every replicate with its own stream.
+        for r, rng in enumerate(rngs):
+            mutated = rng.random(shape) < mutation_rate
+            shifts = rng.integers(1, n_letters, size=shape)
+            population[r] = np.where(mutated, (population[r] + shifts) % n_letters, population[r])
+        fitness = landscape.fitness(population.reshape(-1, length)).reshape(n_replicates, population_size)
+        # Draw the next generation in proportion to fitness, or uniformly if
+        # no individual of a replicate folds at all.
+        for r, rng in enumerate(rngs):
+            total = fitness[r].sum()
+            p = fitness[r] / total if total > 0 else None
+            parents = rng.choice(population_size, size=population_size, p=p)
+            population[r] = population[r][parents]
+            fitness[r] = fitness[r][parents]
+        mean_fitness[generation] = fitness.mean(axis=1)
+    return population, mean_fitness
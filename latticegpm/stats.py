@@ -0,0 +1,117 @@
+__doc__ = """
+
+Opt-in instrumentation for folding sequences and building maps.
+
+A `Stats` object counts work (sequences folded, conformations scored, cache
+hits) and adds up the wall time spent in each stage. Pass one as `stats` to a
+map or thermodynamics object to fill it in; without one, nothing is counted
+or timed.
+
+Example call:
+
+    >>> stats = Stats()
+    >>> gpm = LatticeGenotypePhenotypeMap(wildtype, mutations, conformations=confs, stats=stats)
+    >>> stats.timings
+    >>> stats.to_json("build.json")
+
+"""
+
+import json
+from timeit import default_timer
+
+class Stats(object):
+    """Counters and per-stage wall times.
+
+    Attributes
+    ----------
+    counters : dict
+        mapping of counter names (e.g. 'folds', 'conformations_scored',
+        'cache_hits') to counts.
+    timings : dict
+        mapping of stage names (e.g. 'genotypes', 'energies',
+        'thermodynamics') to total seconds spent in them.
+    calls : dict
+        mapping of stage names to the number of times they were entered.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self.calls = {}
+
+    def count(self, name, n=1):
+        """Add `n` to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def stage(self, name):
+        """Time a stage. Use as a context manager:
+
+            >>> with stats.stage("energies"):
+            ...     energies = energy_matrix(sequences, index)
+        """
+        return _Stage(self, name)
+
+    def add_time(self, name, seconds):
+        """Add `seconds` to a stage."""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def reset(self):
+        """Clear all counters and timings."""
+        self.counters.clear()
+        self.timings.clear()
+        self.calls.clear()
+
+    def as_dict(self):
+        """Get all counters and timings as a dictionary."""
+        return {
+            "counters": dict(self.counters),
+            "timings": dict(self.timings),
+            "calls": dict(self.calls),
+        }
+
+    def to_json(self, filename=None, **kwargs):
+        """Write the stats as JSON to `filename`, or return them as a JSON
+        string if no filename is given. Keyword arguments go to `json.dumps`.
+        """
+        kwargs.setdefault("indent", 2)
+        kwargs.setdefault("sort_keys", True)
+        data = json.dumps(self.as_dict(), **kwargs)
+        if filename is None:
+            return data
+        with open(filename, "w") as f:
+            f.write(data)
+
+    def __repr__(self):
+        return "Stats(%s)" % self.to_json(indent=None)
+
+
+class _Stage(object):
+    """Context manager that adds its wall time to a stage of a Stats object."""
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.add_time(self.name, default_timer() - self.start)
+        return False
+
+
+class _NullStage(object):
+    """Context manager that does nothing, for when stats are disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+NULL_STAGE = _NullStage()
+
+def stage(stats, name):
+    """Time a stage if `stats` is a Stats object; do nothing if it is None."""
+    if stats is None:
+        return NULL_STAGE
+    return _Stage(stats, name)
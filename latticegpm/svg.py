@@ -10,14 +10,15 @@ Example call:
     >>> # drawing.save()
     >>> # Print in Jupyter (IPython) notebook
     >>> drawing.notebook
+    >>> # Render many folds at once, as SVG strings or one tiled sheet.
+    >>> strings = render_many(zip(sequences, configurations))
+    >>> sheet = sprite_sheet(zip(sequences, configurations), columns=10)
 
 """
 
-import svgwrite
-from functools import wraps
-from IPython.display import SVG
+from xml.sax.saxutils import escape
 
-ROTATE = {"U":"R", "R":"D", "D":"L", "L":"U"}
+from .geometry import ROTATE, STEPS, geometry  # noqa: F401 (ROTATE is re-exported)
 
 COLORS = {
     "r": "red",
@@ -29,28 +30,35 @@ COLORS = {
     ".": "black"
 }
 
+# Templates for the elements of a drawing, matching the markup svgwrite
+# writes for `Configuration`.
+SVG_HEADER = ('<svg baseProfile="full" height="%s" version="1.1" width="%s" '
+    'xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"><defs />')
+BOND = '<line stroke="rgb(10%%,10%%,16%%)" style="stroke-width:%s" x1="%s" x2="%s" y1="%s" y2="%s" />'
+LETTER = '<text style="font-size:%spx;font-family:Courier;font-weight:%s;fill:%s" x="%s" y="%s">%s</text>'
+DOT = '<text style="font-size:%spx;font-family:Courier" x="%s" y="%s">.</text>'
+TILE = '<svg height="%s" width="%s" x="%s" y="%s">%s</svg>'
+
+
+def __getattr__(name):
+    # Configuration and Drawing import svgwrite, so load them on first use.
+    if name in ("Configuration", "Drawing"):
+        from . import _drawing
+        return getattr(_drawing, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 def draw(sequence, conf, **kwargs):
     """"""
+    from ._drawing import Configuration
     drawing = Configuration(sequence, conf, **kwargs)
     return drawing
 
 def configuration_to_array(sequence, configuration):
     """Create a square numpy array with the configuration laid out.
     """
-    moves = {"U":[0,-1], "D":[0,1], "R":[1,0], "L":[-1,0]}
-    # find boundaries for drawing
-    xmoves, ymoves = [0], [0]
-    # Figure out the perimeter of the configuration
-    for i in range(len(configuration)):
-        move = configuration[i]
-        xmoves.append(xmoves[i] + moves[move][0])
-        ymoves.append(ymoves[i] + moves[move][1])
     # bounds of configuration
-    xmax = max(xmoves)
-    xmin = min(xmoves)
-    ymax = max(ymoves)
-    ymin = min(ymoves)
+    xmin, ymin, xmax, ymax = geometry(configuration).bounds
     xorigin = 0
     yorigin = 0
     # add letters to grid
@@ -79,7 +87,7 @@ def configuration_to_array(sequence, configuration):
         let = sequence[i+1]
         bond = configuration[i].lower()
         # Get direction
-        step = moves[configuration[i]]
+        step = STEPS[configuration[i]]
         # Define change in x and y for both edges and letter
         dx = step[0]
         dy = step[1]
@@ -93,194 +101,130 @@ def configuration_to_array(sequence, configuration):
         grid[ypos][xpos] = let
     return grid
 
+def render(sequence, configuration, color_sequence=None, **kwargs):
+    """Render the SVG of a folded sequence as a string, without building
+    svgwrite elements. The layout is the same as `Configuration`'s.
 
-class Configuration(SVG):
-    """ Main class for drawing an SVG of a lattice protein's fold.
+    Keyword arguments (rotation, font_size, dot_scale, font_weight) are the
+    same as for `Configuration`.
+    """
+    height, width, body = _render_body(sequence, configuration, color_sequence, **kwargs)
+    return SVG_HEADER % (height, width) + body + "</svg>"
+
+def render_many(items, **kwargs):
+    """Render many folded sequences as SVG strings.
 
     Parameters
     ----------
-    sequence : str
-        Amino acid sequence
-    configuration : str
-        sequence of direction letters describing the 2d configuration.
-    colors : list of strings
-        list of colors for each amino acid in sequence
-    rotation : int
-        rotate the configuration by 0, 90, 180, or 270 degrees
-    font_size : int
-        Font size, in pixels, of sequence in configuration. The svg will scale
-        with the font size of the letters.
-
-    Examples
-    --------
-    >>> # Create an instance
-    >>> drawing = Configuration(sequence, configuration)
-    >>> # Save to file
-    >>> # drawing.save()
-    >>> # Print in Jupyter (IPython) notebook
-    >>> drawing.notebook
+    items : iterable of tuples
+        (sequence, configuration) or (sequence, configuration, color_sequence)
+        of each drawing.
+
+    Returns
+    -------
+    strings : list of str
+        SVG of each drawing.
     """
-    def __init__(self, sequence, configuration,
-        color_sequence=None,
-        rotation=0,
-        font_size=20,
-        dot_scale=1.0,
-        font_weight="normal"
-        ):
-        # Rotate configuration if given
-        # Set sequence and configuration
-        self.sequence = sequence
-        self.rotation = 0
-        self.font_size = font_size
-        self.dot_scale = dot_scale
-        self.font_weight = font_weight
-        # Set configuration
-        self.configuration = configuration
-        # set color
-        if color_sequence is None:
-            self.color_sequence = "k"*len(self.sequence)
-        elif len(color_sequence) != len(self.sequence):
-            raise Exception("color_sequence must have the same length as sequence.")
-        else:
-            self.color_sequence = color_sequence
-        # Sets rotation and configuration
-        self.rotate(rotation)
-
-    @property
-    def data(self):
-        """ Return svg as a string. """
-        return self.drawing.tostring()
+    return [render(*item, **kwargs) for item in items]
 
-    @property
-    def notebook(self):
-        """ Display SVG in Jupyther notebook. """
-        try:
-            # Import IPython display for notebook
-            from IPython.display import SVG as ipython_display
-            # Display in notebook
-            return ipython_display(self.string)
-        except ImportError:
-            raise Warning(""" IPython not installed. """)
+def sprite_sheet(items, columns=10, **kwargs):
+    """Render many folded sequences into one SVG, tiled in a grid.
 
-    def rotate(self, rotation):
-        """Rotate the drawing by 90, 180, or 270.
-        """
-        # Rotate svg if desired.
-        n = int(rotation/90)
-        self.rotation += n
-        for i in range(n):
-            self.configuration = "".join([ROTATE[c] for c in self.configuration])
-        self._build_drawing()
+    Every tile is as big as the largest drawing, and drawings are placed in
+    rows of `columns` tiles.
 
-    def save(self, filename):
-        """ save svg """
-        self.drawing.saveas(filename)
-
-    def _add_item(self, x, y):
-        """Adds item at position (x,y) in array.
-        """
-        # Try if it's a bond
-        try:
-            if self.mapping[self.array[y][x]] is not None:
-                # Get SVG element to add
-                item = self.mapping[self.array[y][x]]
-                # Add element
-                item(2*self.offset+self.font_size*x,
-                    2*self.offset+self.font_size*y)
-        # Otherwise its a letter
-        except KeyError:
-            # Add color to specific letters if given
-            color = COLORS[self.color_array[x][y]]
-            self.drawing.letter(2*self.offset+self.font_size*x,
-                2*self.offset+self.font_size*y,
-                self.array[y][x],
-                color=color)
-
-    def _build_drawing(self):
-        """Build drawing object."""
-        self.array = configuration_to_array(self.sequence, self.configuration)
-        self.color_array = configuration_to_array(self.color_sequence, self.configuration)
-        # Build SVG grid object
-        self.shape = (len(self.array), len(self.array[0]))
-        self.height = self.font_size * self.shape[0]
-        self.width = self.font_size * self.shape[1]
-        self.drawing = Drawing(
-            font_size=self.font_size,
-            size=(self.width, self.height),
-            dot_scale=self.dot_scale
-        )
-        self.offset = 0.25 * self.font_size
-        # Object for how to draw a configuration
-        self.mapping = {"d":self.drawing.down,
-            "u":self.drawing.up,
-            "r":self.drawing.right,
-            "l":self.drawing.left,
-            ".":self.drawing.dot,
-            " ":None
-        }
-        # Draw grid in svg
-        for y in range(self.shape[0]):
-            for x in range(self.shape[1]):
-                self._add_item(x,y)
-
-class Drawing(svgwrite.Drawing):
-    """Wrap svgwrite.Drawing object with extra methods that make drawing lattice
-    proteins much easier
+    Returns
+    -------
+    sheet : str
+        SVG of the sheet.
     """
-    def __init__(self, font_size=20, dot_scale=1.0, font_weight="normal", **kwargs):
-        self.font_size = font_size
-        self.stepsize = 0.25*font_size
-        self.linewidth = 0.1*font_size
-        self.dot_scale = dot_scale
-        self.font_weight = font_weight
-        super(Drawing, self).__init__(**kwargs)
-
-    def bond(self, start, end):
-        """ Create an svg line object to add to a svgwrite drawing object.
-        """
-        line = self.line(start, end, stroke=svgwrite.rgb(10,10,16, '%'), style="stroke-width:" + str(self.linewidth))
-        self.add(line)
-
-    def right(self, x, y):
-        """ Add a right facing line to figure. """
-        start = (x-self.stepsize,y)
-        end = (x+self.stepsize,y)
-        self.bond(start,end)
-
-    def left(self, x, y):
-        """ Add a right facing line to figure. """
-        start = (x+self.stepsize,y)
-        end = (x-self.stepsize,y)
-        self.bond(start,end)
-
-    def up(self, x, y):
-        """ Add a right facing line to figure. """
-        start = (x,y-self.stepsize)
-        end = (x,y+self.stepsize)
-        self.bond(start, end)
-
-    def down(self, x, y):
-        """ Add a right facing line to figure. """
-        start = (x,y+self.stepsize)
-        end = (x,y-self.stepsize)
-        self.bond(start,end)
-
-    def letter(self, x, y, char, color="black"):
-        """ Add letter to grid where residues exist. """
-        xoffset = -self.stepsize-0.1*self.stepsize
-        yoffset = self.stepsize
-        letter = self.text(char, insert=(x + xoffset,y + yoffset),
-            style="font-size:"+str(self.font_size)+
-            "px;font-family:Courier;"
-            "font-weight:" + self.font_weight + ";"
-            "fill:" + str(color))
-        return self.add(letter)
-
-    def dot(self, x, y):
-        """ Add a dot on grid where no letter exists"""
-        xoffset = (-self.stepsize-0.15*self.stepsize)*self.dot_scale
-        yoffset = (self.stepsize/2)
-        letter = self.text('.', insert=(x + xoffset, y + yoffset),
-            style="font-size:"+str(self.font_size * self.dot_scale)+
-            "px;font-family:Courier")
-        return self.add(letter)
+    drawings = [_render_body(*item, **kwargs) for item in items]
+    if len(drawings) == 0:
+        return SVG_HEADER % (0, 0) + "</svg>"
+    tile_height = max([d[0] for d in drawings])
+    tile_width = max([d[1] for d in drawings])
+    tiles = []
+    for i, (height, width, body) in enumerate(drawings):
+        row, column = divmod(i, columns)
+        tiles.append(TILE % (height, width, column * tile_width, row * tile_height, body))
+    n_rows = (len(drawings) + columns - 1) // columns
+    n_columns = min(columns, len(drawings))
+    return SVG_HEADER % (n_rows * tile_height, n_columns * tile_width) + "".join(tiles) + "</svg>"
+
+def _render_body(sequence, configuration, color_sequence=None, rotation=0, font_size=20,
+    dot_scale=1.0, font_weight="normal"):
+    """Lay out a folded sequence and render its elements.
+
+    Returns
+    -------
+    height, width : numbers
+        size of the drawing.
+    body : str
+        SVG elements of the drawing.
+    """
+    if color_sequence is None:
+        color_sequence = "k" * len(sequence)
+    elif len(color_sequence) != len(sequence):
+        raise Exception("color_sequence must have the same length as sequence.")
+    shape = geometry(configuration)
+    if rotation >= 90:
+        shape = shape.rotated(int(rotation / 90))
+    grid, colors = _layout(sequence, shape, color_sequence)
+    # Same arithmetic as Configuration and Drawing, so numbers print the same.
+    offset = 0.25 * font_size
+    stepsize = 0.25 * font_size
+    linewidth = str(0.1 * font_size)
+    letter_dx = -stepsize - 0.1 * stepsize
+    dot_dx = (-stepsize - 0.15 * stepsize) * dot_scale
+    dot_dy = stepsize / 2
+    dot_size = font_size * dot_scale
+    elements = []
+    for y, row in enumerate(grid):
+        for x, item in enumerate(row):
+            if item == " ":
+                continue
+            X = 2 * offset + font_size * x
+            Y = 2 * offset + font_size * y
+            if item == ".":
+                elements.append(DOT % (dot_size, X + dot_dx, Y + dot_dy))
+            elif item == "r":
+                elements.append(BOND % (linewidth, X - stepsize, X + stepsize, Y, Y))
+            elif item == "l":
+                elements.append(BOND % (linewidth, X + stepsize, X - stepsize, Y, Y))
+            elif item == "u":
+                elements.append(BOND % (linewidth, X, X, Y - stepsize, Y + stepsize))
+            elif item == "d":
+                elements.append(BOND % (linewidth, X, X, Y + stepsize, Y - stepsize))
+            else:
+                elements.append(LETTER % (font_size, font_weight, COLORS[colors[(y, x)]],
+                    X + letter_dx, Y + stepsize, escape(item)))
+    return font_size * len(grid), font_size * len(grid[0]), "".join(elements)
+
+def _layout(sequence, shape, color_sequence):
+    """Lay a folded sequence out on a grid from its `Geometry`, like
+    `configuration_to_array`.
+
+    Returns
+    -------
+    grid : list of lists
+        rows of the grid, with residues, bonds ('u', 'd', 'l', 'r'), dots
+        and blanks.
+    colors : dict
+        color letter of each residue, keyed by its (row, column).
+    """
+    xmin, ymin, xmax, ymax = shape.bounds
+    xmin, ymin = 2 * xmin - 2, 2 * ymin - 2
+    xgrid = 2 * xmax + 3 - xmin
+    ygrid = 2 * ymax + 3 - ymin
+    dots = [" " if i % 2 else "." for i in range(xgrid)]
+    grid = [list(dots) if j % 2 == 0 else [" "] * xgrid for j in range(ygrid)]
+    colors = {}
+    sites = (2 * shape.coordinates - (xmin, ymin)).tolist()
+    for i, (x, y) in enumerate(sites):
+        grid[y][x] = sequence[i]
+        colors[(y, x)] = color_sequence[i]
+    for i, move in enumerate(shape.conformation):
+        x, y = sites[i]
+        dx, dy = STEPS[move]
+        grid[y + dy][x + dx] = move.lower()
+    return grid, colors
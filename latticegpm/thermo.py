@@ -3,7 +3,9 @@
 # lattice protein sequence space. Note: these were not designed with
 # speed/efficiency in mind. They are bit crude in their implementation.
 #
-import itertools as it
+import os
+import warnings
+import multiprocessing
 import numpy as np
 
 # ------------------------------------------------------------
@@ -12,14 +14,57 @@ import numpy as np
 
 from latticeproteins.interactions import miyazawa_jernigan
 
+from .cache import PHENOTYPES, conformations_hash, model_key
+from .stats import stage
+from .geometry import Geometry, geometry
+
+# Steps on the lattice for each move in a conformation.
+MOVES = {"U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1)}
+
+# Genotypes folded incrementally before energies are recomputed from scratch.
+GRAY_CODE_CHUNKSIZE = 1024
+
+# Energies closer than this to the lowest energy count as degenerate minima.
+DEGENERACY_TOLERANCE = 1e-8
+
+# Types of the per-sequence columns computed by `thermodynamics_from_energies`.
+COLUMN_TYPES = {
+    "stability": float,
+    "fracfolded": float,
+    "folded": bool,
+    "native_conf": np.int32,
+    "native_energy": float,
+    "log_partition_function": float,
+}
+
 class LatticeThermodynamics(object):
     """Calculate Lattice thermodynamics for a sequence from a list of conformations.
 
     Currently, doesn't do a lot of quality control
+
+    `conf_list` can also be a ConformationIndex; reuse one index when building
+    many LatticeThermodynamics objects from the same conformations.
+
+    If a `cache.PhenotypeCache` or `cache.MemoryCache` is given as `cache`,
+    energies are looked up there before folding, and stored there after.
+    Mutants from `mutate` share the cache, and `scan_mutants` looks up and
+    stores the phenotypes of every mutant there.
+
+    If a `stats.Stats` object is given as `stats`, folds, conformations
+    scored, cache hits and the time spent in each stage are recorded there.
     """
-    def __init__(self, sequence, conf_list, temperature, interaction_energies=miyazawa_jernigan, target=None):
+    def __init__(self, sequence, conf_list, temperature, interaction_energies=miyazawa_jernigan, target=None,
+        cache=None,
+        stats=None):
         self.sequence = sequence
-        self.conf_list = conf_list
+        self.cache = cache
+        self.stats = stats
+        if isinstance(conf_list, ConformationIndex):
+            self.conf_index = conf_list
+            self.conf_list = conf_list.conf_list
+        else:
+            self.conf_index = ConformationIndex(conf_list)
+            self.conf_list = conf_list
         self.temperature = temperature
         self.interaction_energies = interaction_energies
         self.target = target
@@ -34,21 +79,47 @@ class LatticeThermodynamics(object):
         try:
             return self._energies
         except AttributeError:
-            self._energies = energy_list(self.sequence,
-                self.conf_list,
-                interaction_energies=self.interaction_energies)
+            if self.cache is not None:
+                key = model_key(self.conf_index.digest, self.interaction_energies)
+                with stage(self.stats, "cache"):
+                    self._energies = self.cache.get_energies("".join(self.sequence), key)
+                if self._energies is not None:
+                    if self.stats is not None:
+                        self.stats.count("cache_hits")
+                    return self._energies
+                if self.stats is not None:
+                    self.stats.count("cache_misses")
+            with stage(self.stats, "energies"):
+                self._energies = energy_list(self.sequence,
+                    self.conf_index,
+                    interaction_energies=self.interaction_energies)
+            if self.stats is not None:
+                self.stats.count("folds")
+                self.stats.count("conformations_scored", len(self.conf_index))
+            if self.cache is not None:
+                self.cache.set_energies("".join(self.sequence), key, self._energies)
             return self._energies
 
     @property
-    def partition_function(self):
-        """Get the partition sum for lattice."""
+    def log_partition_function(self):
+        """Get the log of the partition sum for lattice."""
         try:
-            return self._partition_sum
+            return self._log_partition_sum
         except AttributeError:
-            self._partition_sum = partition_function_from_energies(
-                self.energies,
-                self.temperature)
-            return self._partition_sum
+            energies = self.energies
+            with stage(self.stats, "thermodynamics"):
+                self._log_partition_sum = log_partition_function_from_energies(
+                    energies,
+                    self.temperature,
+                    degeneracy=self.conf_index.degeneracy)
+            return self._log_partition_sum
+
+    @property
+    def partition_function(self):
+        """Get the partition sum for lattice. It overflows to inf (with a
+        RuntimeWarning) at low temperatures; use `log_partition_function` there.
+        """
+        return np.exp(self.log_partition_function)
 
     @property
     def stability(self):
@@ -57,10 +128,7 @@ class LatticeThermodynamics(object):
         try:
             return self._stability
         except AttributeError:
-            self._stability, self._folded = stability_from_energies(
-                self.energies,
-                self.temperature,
-                minE=self.minE)
+            self._fold()
             return self._stability
 
     @property
@@ -69,11 +137,36 @@ class LatticeThermodynamics(object):
         try:
             return self._folded
         except AttributeError:
+            self._fold()
+            return self._folded
+
+    def _fold(self):
+        """Calculate stability and folded from the energies."""
+        energies = self.energies
+        with stage(self.stats, "thermodynamics"):
             self._stability, self._folded = stability_from_energies(
-                self.energies,
+                energies,
                 self.temperature,
-                minE=self.minE)
-            return self._folded
+                degeneracy=self.conf_index.degeneracy,
+                **self._native_state())
+
+    def _native_state(self):
+        """Keyword arguments for `thermodynamics_from_energies` that make the
+        target the native state.
+
+        A target in the index is passed by position, since energies built up
+        by `mutate` can differ from `minE` by rounding error.
+        """
+        try:
+            return self._native
+        except AttributeError:
+            self._native = {}
+            if self.target is not None:
+                try:
+                    self._native = {"native": self.conf_index.find(self.target)}
+                except ValueError:
+                    self._native = {"minE": self.minE}
+            return self._native
 
     @property
     def fracfolded(self):
@@ -85,26 +178,724 @@ class LatticeThermodynamics(object):
                 self.temperature)
             return self._fracfolded
 
+    def at_temperatures(self, temperatures, phenotype_type="stability"):
+        """Calculate stability, fracfolded, partition_function or log_partition_function at many
+        temperatures without recomputing energies. See `temperature_sweep`.
+        """
+        return temperature_sweep(self.energies,
+            temperatures,
+            phenotype_type=phenotype_type,
+            degeneracy=self.conf_index.degeneracy,
+            **self._native_state())
+
+    @property
+    def native_conf(self):
+        """Get the native conformation (None if the protein doesn't fold)."""
+        if self.target is not None:
+            return self.target
+        if not self.folded:
+            return None
+        return self.conf_index.conf_list[np.argmin(self.energies)]
+
+    @property
+    def interactions(self):
+        """Interaction energies as an (alphabet, matrix) pair; see `interaction_matrix`."""
+        try:
+            return self._interactions
+        except AttributeError:
+            self._interactions = interaction_matrix(self.interaction_energies)
+            return self._interactions
+
+    def mutate(self, site, aa):
+        """Get the thermodynamics of a single mutant of this sequence.
+
+        Only the contacts that touch `site` change, so the mutant's energies
+        are this sequence's energies plus a per-conformation correction.
+
+        Parameters
+        ----------
+        site : int
+            index of the site to mutate.
+        aa : str
+            amino acid at `site` in the mutant.
+
+        Returns
+        -------
+        mutant : LatticeThermodynamics
+            thermodynamics of the mutant sequence.
+        """
+        sequence = "".join(self.sequence)
+        sequence = sequence[:site] + aa + sequence[site+1:]
+        mutant = LatticeThermodynamics(sequence,
+            self.conf_index,
+            self.temperature,
+            interaction_energies=self.interaction_energies,
+            target=self.target,
+            cache=self.cache,
+            stats=self.stats)
+        mutant._interactions = self.interactions
+        if "native" in self._native_state():
+            mutant._native = self._native
+        energies = self.energies
+        with stage(self.stats, "mutate"):
+            mutant._energies = energies + self.conf_index.mutation_deltas(
+                self.sequence, site, aa, self.interactions)
+        if self.stats is not None:
+            self.stats.count("mutants")
+        return mutant
+
+    def scan_mutants(self, amino_acids=None, sites=None):
+        """Calculate the thermodynamics of every single mutant of this sequence.
+
+        The energies of the mutants at a site are this sequence's energies
+        plus one row of corrections per amino acid, so each site is scored as
+        one block without refolding any mutant.
+
+        Parameters
+        ----------
+        amino_acids : list of str (optional)
+            amino acids to mutate each site to. Defaults to every amino acid
+            in the interaction energies.
+        sites : list of ints (optional)
+            sites to mutate. Defaults to every site.
+
+        Returns
+        -------
+        table : dict of 2d arrays
+            one array per column in COLUMN_TYPES, with shape (number of sites,
+            number of amino acids).
+        """
+        alphabet, matrix = self.interactions
+        if amino_acids is None:
+            amino_acids = sorted(alphabet, key=alphabet.get)
+        if sites is None:
+            sites = range(len(self.sequence))
+        sites = list(sites)
+        table = dict([(name, np.empty((len(sites), len(amino_acids)), dtype=dtype))
+            for name, dtype in COLUMN_TYPES.items()])
+        if self.cache is not None:
+            key = model_key(self.conf_index.digest,
+                self.interaction_energies,
+                target=self.target,
+                temperature=self.temperature)
+            sequence = "".join(self.sequence)
+        # Target that isn't in the index: track its energy in each mutant.
+        native, target_index = {}, None
+        if self.target is not None:
+            try:
+                native = {"native": self.conf_index.find(self.target)}
+            except ValueError:
+                target_index = ConformationIndex([self.target])
+        for row, site in enumerate(sites):
+            if self.cache is not None:
+                mutants = [sequence[:site] + aa + sequence[site+1:] for aa in amino_acids]
+                with stage(self.stats, "cache"):
+                    cached = self.cache.get_phenotypes(mutants, key)
+                if len(cached) == len(set(mutants)):
+                    if self.stats is not None:
+                        self.stats.count("cache_hits", len(mutants))
+                    for name, column in zip(PHENOTYPES, zip(*[cached[m] for m in mutants])):
+                        table[name][row] = column
+                    continue
+                if self.stats is not None:
+                    # The site is scored as one block, but only the mutants
+                    # that weren't cached are misses.
+                    n_cached = len([m for m in mutants if m in cached])
+                    self.stats.count("cache_hits", n_cached)
+                    self.stats.count("cache_misses", len(mutants) - n_cached)
+            with stage(self.stats, "energies"):
+                energies = self.energies + self.conf_index.site_deltas(
+                    self.sequence, site, amino_acids, self.interactions)
+                if target_index is not None:
+                    native = {"minE": self.minE + target_index.site_deltas(
+                        self.sequence, site, amino_acids, self.interactions)[:, 0]}
+            with stage(self.stats, "thermodynamics"):
+                block = thermodynamics_from_energies(energies,
+                    self.temperature,
+                    degeneracy=self.conf_index.degeneracy,
+                    **native)
+            if self.stats is not None:
+                self.stats.count("folds", len(amino_acids))
+                self.stats.count("conformations_scored", len(amino_acids) * len(self.conf_index))
+            for name in COLUMN_TYPES:
+                table[name][row] = block[name]
+            if self.cache is not None:
+                self.cache.set_phenotypes(mutants, key, block)
+        return table
+
+class LatticeThermodynamicsMatrix(object):
+    """Calculate Lattice thermodynamics for many sequences from a list of
+    conformations. All energies are computed in one pass with `energy_matrix`.
+
+    If `chunksize` is given, sequences are folded in chunks of that size and
+    only the per-sequence results are kept, so memory doesn't grow with the
+    number of sequences times the number of conformations.
+
+    Parameters
+    ----------
+    sequences : list of str
+        Amino acid sequences, all the same length as the conformations.
+    conf_list : list of str or ConformationIndex
+        conformations in the ensemble.
+    temperature : float
+        temperature parameter for calculating folding stability.
+    interaction_energies : dict
+        mapping of two-letter contacts to their energies.
+    target : str (optional)
+        conformation to treat as the native state of every sequence.
+    chunksize : int (optional)
+        number of sequences to fold at a time.
+    memmap : str (optional)
+        directory to write the per-sequence results to as memory-mapped
+        `.npy` files, instead of keeping them in memory.
+    n_jobs : int
+        number of processes to fold chunks of sequences in. -1 uses all CPUs.
+        Results are in the same order as `sequences`.
+    cache : cache.PhenotypeCache or cache.MemoryCache (optional)
+        cache to look up phenotypes in before folding. Only the sequences
+        that aren't cached are folded.
+    strategy : str
+        'matrix' folds sequences with `energy_matrix`. 'graycode' requires
+        `sequences` to be a complete binary genotype space: genotypes are
+        visited in Gray-code order, where each differs from the last at one
+        site, and energies are updated with `ConformationIndex.mutation_deltas`.
+        With a cache, the cache is checked first; if no sequence is cached
+        the space is folded in Gray-code order, otherwise the missing
+        sequences aren't a complete space and are folded with 'matrix'
+        (with a warning).
+    stats : stats.Stats (optional)
+        record folds, conformations scored, cache hits and the time spent in
+        each stage here.
+
+    Attributes
+    ----------
+    energies : 2d array of floats
+        energy of each sequence (rows) in each conformation (columns).
+    log_partition_function : array of floats
+        log of the partition sum of each sequence.
+    partition_function : array of floats
+        partition sum of each sequence (computed from the log; overflows to
+        inf at low temperatures).
+    stability : array of floats
+        stability of the native state of each sequence.
+    folded : array of bools
+        True if the sequence has a unique native state.
+    fracfolded : array of floats
+        fraction folded of each sequence.
+    native_conf : array of ints
+        position of the native conformation of each sequence in the index.
+    native_energy : array of floats
+        energy of the native conformation of each sequence.
+    table : dict of arrays
+        all of the per-sequence arrays above, computed in one pass.
+    """
+    def __init__(self, sequences, conf_list, temperature, interaction_energies=miyazawa_jernigan, target=None,
+        chunksize=None,
+        memmap=None,
+        n_jobs=1,
+        cache=None,
+        strategy="matrix",
+        stats=None):
+        self.sequences = list(sequences)
+        self.stats = stats
+        if isinstance(conf_list, ConformationIndex):
+            self.conf_index = conf_list
+            self.conf_list = conf_list.conf_list
+        else:
+            with stage(self.stats, "conformations"):
+                self.conf_index = ConformationIndex(conf_list)
+            self.conf_list = conf_list
+        self.temperature = temperature
+        self.interaction_energies = interaction_energies
+        self.target = target
+        self.chunksize = chunksize
+        self.memmap = memmap
+        self.n_jobs = n_jobs
+        if self.n_jobs < 0:
+            self.n_jobs = multiprocessing.cpu_count()
+        self.cache = cache
+        if strategy not in ("matrix", "graycode"):
+            raise Exception("strategy must be 'matrix' or 'graycode'.")
+        self.strategy = strategy
+
+    @property
+    def energies(self):
+        """Get the energies of all sequences in all conformations."""
+        try:
+            return self._energies
+        except AttributeError:
+            with stage(self.stats, "energies"):
+                self._energies = energy_matrix(self.sequences,
+                    self.conf_index,
+                    interaction_energies=self.interaction_energies)
+            return self._energies
+
+    @property
+    def minE(self):
+        """Energy of the target conformation for each sequence (None if no target)."""
+        if self.target is None:
+            return None
+        try:
+            return self._minE
+        except AttributeError:
+            if self.chunksize is None:
+                self._minE = self._native_energies(self.sequences, self.energies)
+            else:
+                self._minE = np.concatenate([self._native_energies(self.sequences[start:stop], energies)
+                    for start, stop, energies in self.iter_energies()])
+            return self._minE
+
+    @property
+    def table(self):
+        """Per-sequence thermodynamics as a dictionary of typed arrays, one for
+        each column in COLUMN_TYPES. All columns are computed in one pass.
+        """
+        try:
+            return self._table
+        except AttributeError:
+            self._table = dict([(name, self._allocate(name, dtype)) for name, dtype in COLUMN_TYPES.items()])
+            if self.cache is not None:
+                self._fold_cached()
+            elif self.strategy == "graycode":
+                self._fold_gray_code()
+            elif self.chunksize is not None or self.n_jobs > 1:
+                self._fold_chunks()
+            else:
+                energies = self.energies
+                with stage(self.stats, "thermodynamics"):
+                    self._store(slice(None), thermodynamics_from_energies(energies,
+                        self.temperature,
+                        degeneracy=self.conf_index.degeneracy,
+                        **self._native_state(self.sequences)))
+                self._count_folds(len(self.sequences))
+            return self._table
+
+    @property
+    def log_partition_function(self):
+        """Get the log of the partition sum of all sequences."""
+        return self.table["log_partition_function"]
+
+    @property
+    def partition_function(self):
+        """Get the partition sum of all sequences. It overflows to inf (with a
+        RuntimeWarning) at low temperatures; use `log_partition_function` there.
+        """
+        return np.exp(self.log_partition_function)
+
+    @property
+    def stability(self):
+        """Get stabilities of all sequences."""
+        return self.table["stability"]
+
+    @property
+    def folded(self):
+        """Get folded attribute of all sequences."""
+        return self.table["folded"]
+
+    @property
+    def fracfolded(self):
+        """Get fraction folded of all sequences."""
+        return self.table["fracfolded"]
+
+    @property
+    def native_conf(self):
+        """Get the position of each sequence's native conformation in the
+        conformation index (-1 if it doesn't fold).
+        """
+        return self.table["native_conf"]
+
+    @property
+    def native_energy(self):
+        """Get the energy of each sequence's native conformation."""
+        return self.table["native_energy"]
+
+    def iter_energies(self):
+        """Iterate over the energies of chunks of sequences.
+
+        Yields
+        ------
+        start, stop : int
+            range of sequences in the chunk.
+        energies : 2d array of floats
+            energies of the chunk of sequences in all conformations.
+        """
+        for start, stop in self._chunks():
+            energies = energy_matrix(self.sequences[start:stop],
+                self.conf_index,
+                interaction_energies=self.interaction_energies)
+            yield start, stop, energies
+
+    def at_temperatures(self, temperatures, phenotype_type="stability"):
+        """Calculate stability, fracfolded, partition_function or log_partition_function of all
+        sequences at many temperatures without recomputing energies.
+
+        Returns
+        -------
+        phenotypes : 2d array of floats
+            phenotypes with shape (number of sequences, len(temperatures)).
+        """
+        if self.chunksize is None:
+            return temperature_sweep(self.energies,
+                temperatures,
+                phenotype_type=phenotype_type,
+                minE=self.minE,
+                degeneracy=self.conf_index.degeneracy)
+        # Energies aren't kept in chunked mode; compute each chunk once for all
+        # temperatures.
+        temperatures = np.atleast_1d(temperatures)
+        phenotypes = np.empty((len(self.sequences), len(temperatures)), dtype=float)
+        for start, stop, energies in self.iter_energies():
+            minE = self._native_energies(self.sequences[start:stop], energies)
+            phenotypes[start:stop] = temperature_sweep(energies,
+                temperatures,
+                phenotype_type=phenotype_type,
+                minE=minE,
+                degeneracy=self.conf_index.degeneracy)
+        return phenotypes
+
+    def _count_folds(self, n):
+        """Count `n` folded sequences in the stats."""
+        if self.stats is not None:
+            self.stats.count("folds", n)
+            self.stats.count("conformations_scored", n * len(self.conf_index))
+
+    def _native_state(self, sequences):
+        """Keyword arguments for `thermodynamics_from_energies` that make the
+        target the native state of a block of sequences.
+        """
+        if self.target is None:
+            return {}
+        try:
+            return {"native": self.conf_index.find(self.target)}
+        except ValueError:
+            return {"minE": np.array([fold_energy(s, self.target, interactions=self.interaction_energies)
+                for s in sequences])}
+
+    def _native_energies(self, sequences, energies):
+        """Energy of the target conformation for a block of sequences."""
+        if self.target is None:
+            return None
+        try:
+            return energies[:, self.conf_index.find(self.target)]
+        except ValueError:
+            return np.array([fold_energy(s, self.target, interactions=self.interaction_energies)
+                for s in sequences])
+
+    def _allocate(self, name, dtype):
+        """Allocate an array with one element per sequence."""
+        if self.memmap is None:
+            return np.empty(len(self.sequences), dtype=dtype)
+        if not os.path.exists(self.memmap):
+            os.makedirs(self.memmap)
+        return np.lib.format.open_memmap(os.path.join(self.memmap, name + ".npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(len(self.sequences),))
+
+    def _chunks(self):
+        """Get the (start, stop) range of each chunk of sequences."""
+        n = len(self.sequences)
+        chunksize = self.chunksize
+        if chunksize is None:
+            # A few chunks per process balances the load across the pool.
+            chunksize = int(np.ceil(n / (4.0 * self.n_jobs)))
+        chunksize = max(chunksize, 1)
+        return [(start, min(start + chunksize, n)) for start in range(0, n, chunksize)]
+
+    def _fold_chunks(self):
+        """Fold sequences chunk by chunk and store their stability, folded and
+        log_partition_function.
+        """
+        chunks = [(start, self.sequences[start:stop]) for start, stop in self._chunks()]
+        if self.n_jobs > 1:
+            # Build the incidence matrix before it's copied to every worker.
+            self.conf_index.incidence
+            pool = multiprocessing.Pool(self.n_jobs,
+                initializer=_init_worker,
+                initargs=(self.conf_index, self.temperature, self.interaction_energies, self.target))
+            try:
+                # Workers can't report their stages, so time the whole pool.
+                with stage(self.stats, "fold_chunks"):
+                    results = pool.imap(_fold_chunk_worker, chunks)
+                    self._store_chunks(results)
+                self._count_folds(len(self.sequences))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = (_fold_chunk(start, sequences, self.conf_index, self.temperature,
+                self.interaction_energies, self.target, stats=self.stats) for start, sequences in chunks)
+            self._store_chunks(results)
+
+    def _fold_gray_code(self):
+        """Fold a complete binary genotype space in Gray-code order and store
+        stability, folded and log_partition_function in the order of `sequences`.
+        """
+        positions = dict([(s, i) for i, s in enumerate(self.sequences)])
+        base = self.sequences[0]
+        columns = [set(c) for c in zip(*self.sequences)]
+        sites = [i for i, letters in enumerate(columns) if len(letters) > 1]
+        n = 2 ** len(sites)
+        if any([len(columns[i]) != 2 for i in sites]) or len(positions) != n or len(self.sequences) != n:
+            raise Exception("Gray-code folding needs a complete binary genotype space.")
+        flips = [(columns[i] - set(base[i])).pop() for i in sites]
+        chunksize = self.chunksize or GRAY_CODE_CHUNKSIZE
+        chunks = [(start, min(start + chunksize, n), base, sites, flips) for start in range(0, n, chunksize)]
+        if self.n_jobs > 1:
+            pool = multiprocessing.Pool(self.n_jobs,
+                initializer=_init_worker,
+                initargs=(self.conf_index, self.temperature, self.interaction_energies, self.target))
+            try:
+                with stage(self.stats, "graycode"):
+                    results = pool.imap(_fold_gray_chunk_worker, chunks)
+                    self._store_gray_chunks(results, positions)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            with stage(self.stats, "graycode"):
+                results = (_fold_gray_chunk(start, stop, base, sites, flips, self.conf_index,
+                    self.temperature, self.interaction_energies, self.target)
+                    for start, stop, base, sites, flips in chunks)
+                self._store_gray_chunks(results, positions)
+        self._count_folds(len(self.sequences))
+
+    def _store_gray_chunks(self, results, positions):
+        """Scatter chunks folded in Gray-code order back into the table."""
+        for sequences, table in results:
+            self._store([positions[s] for s in sequences], table)
+
+    def _store_chunks(self, results):
+        """Write folded chunks into the table."""
+        for start, table in results:
+            self._store(slice(start, start + len(table["stability"])), table)
+
+    def _store(self, rows, table):
+        """Write columns of thermodynamics into `rows` of the table."""
+        for name in COLUMN_TYPES:
+            self._table[name][rows] = table[name]
+
+    def _fold_cached(self):
+        """Get stability, folded and log_partition_function from the cache, and fold
+        the sequences that aren't cached.
+        """
+        key = model_key(self.conf_index.digest,
+            self.interaction_energies,
+            target=self.target,
+            temperature=self.temperature)
+        with stage(self.stats, "cache"):
+            cached = self.cache.get_phenotypes(self.sequences, key)
+        missing = [s for s in self.sequences if s not in cached]
+        if self.stats is not None:
+            self.stats.count("cache_hits", len(self.sequences) - len(missing))
+            self.stats.count("cache_misses", len(missing))
+        if len(missing) > 0:
+            strategy = self.strategy
+            if strategy == "graycode" and len(missing) < len(self.sequences):
+                warnings.warn("Some sequences are cached; folding the other %d with strategy 'matrix' "
+                    "instead of 'graycode'." % len(missing))
+                strategy = "matrix"
+            lattice = LatticeThermodynamicsMatrix(missing,
+                self.conf_index,
+                self.temperature,
+                interaction_energies=self.interaction_energies,
+                target=self.target,
+                chunksize=self.chunksize,
+                n_jobs=self.n_jobs,
+                strategy=strategy,
+                stats=self.stats)
+            table = lattice.table
+            with stage(self.stats, "cache"):
+                self.cache.set_phenotypes(missing, key, table)
+            columns = zip(*[lattice.table[name] for name in PHENOTYPES])
+            cached.update(zip(missing, columns))
+        rows = [cached[sequence] for sequence in self.sequences]
+        for name, column in zip(PHENOTYPES, zip(*rows)):
+            self._table[name][:] = column
+
+
+# Conformations and model parameters shared by every chunk a worker process folds.
+_worker_data = {}
+
+def _init_worker(conf_index, temperature, interaction_energies, target):
+    """Store the data shared by all chunks in a worker process."""
+    _worker_data["conf_index"] = conf_index
+    _worker_data["temperature"] = temperature
+    _worker_data["interaction_energies"] = interaction_energies
+    _worker_data["target"] = target
+
+def _fold_chunk_worker(chunk):
+    """Fold a (start, sequences) chunk in a worker process."""
+    start, sequences = chunk
+    return _fold_chunk(start, sequences,
+        _worker_data["conf_index"],
+        _worker_data["temperature"],
+        _worker_data["interaction_energies"],
+        _worker_data["target"])
+
+def _fold_chunk(start, sequences, conf_index, temperature, interaction_energies, target, stats=None):
+    """Fold a chunk of sequences.
+
+    Returns
+    -------
+    start : int
+        position of the chunk's first sequence.
+    table : dict of arrays
+        thermodynamics of each sequence in the chunk.
+    """
+    lattice = LatticeThermodynamicsMatrix(sequences,
+        conf_index,
+        temperature,
+        interaction_energies=interaction_energies,
+        target=target,
+        stats=stats)
+    return start, lattice.table
+
+def _fold_gray_chunk_worker(chunk):
+    """Fold a range of a Gray-code traversal in a worker process."""
+    start, stop, base, sites, flips = chunk
+    return _fold_gray_chunk(start, stop, base, sites, flips,
+        _worker_data["conf_index"],
+        _worker_data["temperature"],
+        _worker_data["interaction_energies"],
+        _worker_data["target"])
+
+def _fold_gray_chunk(start, stop, base, sites, flips, conf_index, temperature, interaction_energies, target):
+    """Fold genotypes `start` to `stop` of a binary genotype space in Gray-code order.
+
+    The first genotype is folded from scratch, which keeps rounding errors from
+    building up across chunks; every other genotype differs from the previous
+    one at a single site and its energies are updated incrementally.
+
+    Parameters
+    ----------
+    start, stop : int
+        range of positions in the Gray-code traversal.
+    base : str
+        genotype at position 0.
+    sites : list of ints
+        mutated sites; bit b of the Gray code is site `sites[b]`.
+    flips : list of str
+        amino acid at each mutated site when its bit is set.
+
+    Returns
+    -------
+    sequences : list of str
+        genotypes in traversal order.
+    table : dict of arrays
+        thermodynamics of each genotype.
+    """
+    interactions = interaction_matrix(interaction_energies)
+    code = start ^ (start >> 1)
+    current = list(base)
+    for bit, site in enumerate(sites):
+        if code >> bit & 1:
+            current[site] = flips[bit]
+    energies = np.empty((stop - start, len(conf_index)), dtype=float)
+    energies[0] = conf_index.energies("".join(current), interaction_energies=interaction_energies)
+    sequences = ["".join(current)]
+    for k in range(start + 1, stop):
+        # Consecutive Gray codes differ at the lowest set bit of k.
+        bit = (k & -k).bit_length() - 1
+        site = sites[bit]
+        aa = flips[bit] if current[site] == base[site] else base[site]
+        energies[k - start] = energies[k - start - 1] + conf_index.mutation_deltas(current, site, aa, interactions)
+        current[site] = aa
+        sequences.append("".join(current))
+    lattice = LatticeThermodynamicsMatrix(sequences,
+        conf_index,
+        temperature,
+        interaction_energies=interaction_energies,
+        target=target)
+    lattice._energies = energies
+    return sequences, lattice.table
+
 def energy_list(sequence, conf_list, interaction_energies=miyazawa_jernigan):
     """Calculate a energies from a list of conformations for a given sequence.
+
+    `conf_list` can be a list of conformations or a ConformationIndex. Pass an
+    index when scoring many sequences against the same conformations.
+    """
+    if not isinstance(conf_list, ConformationIndex):
+        conf_list = ConformationIndex(conf_list)
+    return conf_list.energies(sequence, interaction_energies=interaction_energies)
+
+def compress_conformations(conf_list):
+    """Group a list of conformations into unique contact sets.
+
+    Returns
+    -------
+    index : ConformationIndex
+        one conformation per unique contact set, with its multiplicity in
+        `index.degeneracy`.
     """
-    return np.array([fold_energy(sequence, c) for c in conf_list])
+    if not isinstance(conf_list, ConformationIndex):
+        conf_list = ConformationIndex(conf_list)
+    return conf_list.compress()
+
+def energy_matrix(sequences, conf_list, interaction_energies=miyazawa_jernigan):
+    """Calculate the energies of a list of sequences in a list of conformations.
+
+    `conf_list` can be a list of conformations or a ConformationIndex.
+
+    Returns
+    -------
+    energies : 2d array of floats
+        energies with shape (number of sequences, number of conformations).
+    """
+    if not isinstance(conf_list, ConformationIndex):
+        conf_list = ConformationIndex(conf_list)
+    return conf_list.energy_matrix(sequences, interaction_energies=interaction_energies)
+
+def _logsumexp(a, axis=-1):
+    """Compute log(sum(exp(a))) along an axis without overflow."""
+    amax = np.max(a, axis=axis, keepdims=True)
+    amax[~np.isfinite(amax)] = 0
+    with np.errstate(divide="ignore"):
+        out = np.log(np.sum(np.exp(a - amax), axis=axis))
+    return out + np.squeeze(amax, axis=axis)
 
-def partition_function_from_energies(energies, temperature):
+def _log_degeneracy(degeneracy):
+    """Log of conformation degeneracies (None if every conformation is unique)."""
+    if degeneracy is None:
+        return None
+    with np.errstate(divide="ignore"):
+        return np.log(np.asarray(degeneracy, dtype=float))
+
+def log_partition_function_from_energies(energies, temperature, degeneracy=None):
+    """Calculate the log of the partition function from a list of energies.
+
+    `energies` can be a 2d array with one row per sequence, in which case
+    an array with the log-partition function of each row is returned.
+    `degeneracy` gives the number of conformations that share each energy
+    column (see `ConformationIndex.compress`).
+    """
+    energies = np.asarray(energies, dtype=float)
+    exponents = -energies / temperature
+    if degeneracy is not None:
+        exponents = exponents + _log_degeneracy(degeneracy)
+    return _logsumexp(exponents, axis=-1)
+
+def partition_function_from_energies(energies, temperature, degeneracy=None):
     """Calculate a partition function from a list of energies.
+
+    `energies` can be a 2d array with one row per sequence.
     """
-    energies = np.array(energies)
-    boltzmann = np.exp(-energies / temperature)
-    return sum(boltzmann)
+    return np.exp(log_partition_function_from_energies(energies, temperature,
+        degeneracy=degeneracy))
 
 def partition_function(sequence, conf_list, temperature, interaction_energies=miyazawa_jernigan):
-    """Calculate a partition sum from a list of conformations.
+    """Calculate a partition sum from a list of conformations (or a
+    ConformationIndex, whose degeneracies are counted).
     """
+    if not isinstance(conf_list, ConformationIndex):
+        conf_list = ConformationIndex(conf_list)
     energies = energy_list(sequence, conf_list, interaction_energies=interaction_energies)
-    return partition_function_from_energies(energies, temperature)
+    return partition_function_from_energies(energies, temperature, degeneracy=conf_list.degeneracy)
 
 def stability_from_conf_list(sequence, conf_list, temperature, interaction_energies=miyazawa_jernigan, target=None):
-    """Calculate stabilities from list of conformations.
+    """Calculate stabilities from list of conformations (or a
+    ConformationIndex, whose degeneracies are counted).
 
     Returns
     -------
@@ -113,42 +904,155 @@ def stability_from_conf_list(sequence, conf_list, temperature, interaction_energ
     folded : bool
         True if the protein folded, False if not.
     """
+    if not isinstance(conf_list, ConformationIndex):
+        conf_list = ConformationIndex(conf_list)
     # energies
     energies = energy_list(sequence, conf_list, interaction_energies=interaction_energies)
-    # partition function
-    partition = partition_function_from_energies(energies, temperature)
-    # native energy
+    # native energy; a compressed index may hold the target under another
+    # conformation with the same contacts.
+    native = None
     if target is not None:
-        conf_list = list(conf_list)
-        index = conf_list.index(target)
-        minE = [energies[index]]
+        native = conf_list.find(target)
+    return stability_from_energies(energies, temperature, degeneracy=conf_list.degeneracy,
+        native=native)
+
+def folded_from_energies(energies, minE=None, degeneracy=None):
+    """Check whether the lowest energy in a list of energies is unique (to
+    within DEGENERACY_TOLERANCE).
+
+    `energies` can be a 2d array with one row per sequence. If `minE` (the
+    energy of a target conformation) is given, the protein is always folded.
+    """
+    energies = np.asarray(energies, dtype=float)
+    if minE is not None:
+        return np.ones(energies.shape[:-1], dtype=bool)[()]
+    lowest = energies.min(axis=-1)
+    # Energies summed in a different order can differ by rounding error.
+    matches = energies <= lowest[..., None] + DEGENERACY_TOLERANCE
+    if degeneracy is not None:
+        matches = matches * np.asarray(degeneracy)
+    return (np.sum(matches, axis=-1) == 1)[()]
+
+def thermodynamics_from_energies(energies, temperature, minE=None, degeneracy=None, native=None):
+    """Calculate all per-sequence thermodynamic quantities from energies in one
+    pass.
+
+    The sum over non-native states is done in log space, so this doesn't
+    overflow or lose precision at low temperatures or large energies.
+
+    Parameters
+    ----------
+    energies : array of floats
+        energies of all conformations. Can be a 2d array with one row per
+        sequence.
+    temperature : float
+        temperature parameter.
+    minE : float or array of floats (optional)
+        energy of the native (target) conformation of each row. If None, the
+        lowest energy in each row is the native state.
+    degeneracy : array of ints (optional)
+        number of conformations that share each energy column.
+    native : int or array of ints (optional)
+        column of the native (target) conformation of each row. Overrides
+        `minE`.
+
+    Returns
+    -------
+    table : dict of arrays
+        one value per row for each column in COLUMN_TYPES. `native_conf` is the
+        column of the native conformation, or -1 if the protein doesn't fold
+        or its target isn't in `energies`.
+        The partition function is stored as `log_partition_function`,
+        which doesn't overflow at low temperatures.
+    """
+    rows = np.atleast_2d(np.asarray(energies, dtype=float))
+    index = np.arange(len(rows))
+    # Boltzmann exponents of all conformations.
+    exponents = -rows / temperature
+    log_degeneracy = _log_degeneracy(degeneracy)
+    if log_degeneracy is not None:
+        exponents += log_degeneracy
+    log_partition = _logsumexp(exponents, axis=1)
+    if native is not None:
+        native = np.broadcast_to(np.asarray(native, dtype=int), (len(rows),))
+        minE = rows[index, native]
+        found = np.ones(len(rows), dtype=bool)
+        folded = np.ones(len(rows), dtype=bool)
+    elif minE is None:
+        native = np.argmin(rows, axis=1)
+        minE = rows[index, native]
+        found = np.ones(len(rows), dtype=bool)
+        folded = folded_from_energies(rows, degeneracy=degeneracy)
     else:
-        minE = energies[energies==energies.min()]
-    if len(minE) > 1:
-        return 0, False
+        minE = np.broadcast_to(np.asarray(minE, dtype=float), (len(rows),))
+        # Energies summed in a different order can differ by rounding error.
+        matches = np.abs(rows - minE[:, None]) <= DEGENERACY_TOLERANCE
+        native = np.argmax(matches, axis=1)
+        found = matches.any(axis=1)
+        minE = np.where(found, rows[index, native], minE)
+        folded = np.ones(len(rows), dtype=bool)
+    # Sum over every conformation except the native one.
+    rows_found, native_found = index[found], native[found]
+    if degeneracy is None:
+        exponents[rows_found, native_found] = -np.inf
+    else:
+        # Only one of the degenerate conformations is the native state.
+        with np.errstate(divide="ignore"):
+            exponents[rows_found, native_found] = (-minE[found] / temperature +
+                np.log(np.asarray(degeneracy, dtype=float)[native_found] - 1))
+    log_unfolded = _logsumexp(exponents, axis=1)
+    # Native state isn't in the list; remove its weight from the partition
+    # function instead.
+    if not found.all():
+        log_native = -minE[~found] / temperature
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_unfolded[~found] += np.log1p(-np.exp(log_native - log_unfolded[~found]))
     # Calculate stabilities
-    return minE[0] + temperature * np.log(partition - np.exp(-minE[0] / temperature)), True
+    stability = minE + temperature * log_unfolded
+    stability[~folded] = 0
+    return {
+        "stability": stability,
+        "fracfolded": fracfolded_from_stability(stability, temperature),
+        "folded": folded,
+        "native_conf": np.where(found & folded, native, -1).astype(COLUMN_TYPES["native_conf"]),
+        "native_energy": np.array(minE, dtype=float),
+        "log_partition_function": log_partition,
+    }
 
-def stability_from_energies(energies, temperature, minE=None):
+def stability_from_energies(energies, temperature, minE=None, degeneracy=None, native=None):
     """Calculate stability from list of energies.
 
+    The sum over non-native states is done in log space, so this doesn't
+    overflow or lose precision at low temperatures or large energies.
+
+    Parameters
+    ----------
+    energies : array of floats
+        energies of all conformations. Can be a 2d array with one row per
+        sequence.
+    temperature : float
+        temperature parameter.
+    minE : float or array of floats (optional)
+        energy of the native (target) conformation of each row. If None, the
+        lowest energy in each row is the native state.
+    degeneracy : array of ints (optional)
+        number of conformations that share each energy column.
+    native : int or array of ints (optional)
+        column of the native (target) conformation of each row. Overrides
+        `minE`.
+
     Returns
     -------
     stability : float
-        Stability of sequence given conf_list
+        Stability of sequence given conf_list (an array if energies is 2d).
     folded : bool
-        True if the protein folded, False if not.
+        True if the protein folded, False if not (an array if energies is 2d).
     """
-    # partition function
-    partition = partition_function_from_energies(energies, temperature)
-    # native energy
-    if minE is None:
-        minE = energies[energies==energies.min()]
-        if len(minE) > 1:
-            return 0, False
-        minE = minE[0]
-    # Calculate stabilities
-    return minE + temperature * np.log(partition - np.exp(-minE / temperature)), True
+    table = thermodynamics_from_energies(energies, temperature, minE=minE, degeneracy=degeneracy,
+        native=native)
+    if np.ndim(energies) == 1:
+        return table["stability"][0], bool(table["folded"][0])
+    return table["stability"], table["folded"]
 
 def fracfolded_from_conf_list(sequence, conf_list, temperature, interaction_energies=miyazawa_jernigan, target=None):
     """Calculate staiblity from a list of conformations
@@ -158,18 +1062,75 @@ def fracfolded_from_conf_list(sequence, conf_list, temperature, interaction_ener
         temperature,
         interaction_energies=interaction_energies,
         target=target)
-    return 1.0 / (1 + np.exp(stability/temperature))
+    return fracfolded_from_stability(stability, temperature)
 
-def fracfolded_from_energies(energies, temperature, minE=None):
+def fracfolded_from_energies(energies, temperature, minE=None, degeneracy=None):
     """Calculate a fraction folded from a list of energies.
+
+    `energies` can be a 2d array with one row per sequence.
     """
-    stability, folded = stability_from_energies(energies, temperature, minE=minE)
-    return 1.0 / (1 + np.exp(stability/temperature))
+    stability, folded = stability_from_energies(energies, temperature, minE=minE,
+        degeneracy=degeneracy)
+    return fracfolded_from_stability(stability, temperature)
 
 def fracfolded_from_stability(stability, temperature):
     """Calculate a fraction folded from stability
     """
-    return 1.0 / (1 + np.exp(stability/temperature))
+    # 1 / (1 + exp(x)) written so that large x doesn't overflow.
+    return np.exp(-np.logaddexp(0, np.asarray(stability) / temperature))
+
+def temperature_sweep(energies, temperatures, phenotype_type="stability", minE=None, degeneracy=None,
+    native=None):
+    """Calculate a thermodynamic phenotype at many temperatures from one set of
+    energies. Energies don't depend on temperature, so they are only computed
+    once; e.g. a melting curve is the 'fracfolded' sweep.
+
+    Parameters
+    ----------
+    energies : array of floats
+        energies of all conformations. Can be a 2d array with one row per
+        sequence.
+    temperatures : array of floats
+        temperatures to calculate the phenotype at.
+    phenotype_type : str
+        'stability', 'fracfolded', 'partition_function' or
+        'log_partition_function'.
+    minE : float or array of floats (optional)
+        energy of the native (target) conformation of each row.
+    degeneracy : array of ints (optional)
+        number of conformations that share each energy column.
+    native : int or array of ints (optional)
+        column of the native (target) conformation of each row. Overrides
+        `minE`.
+
+    Returns
+    -------
+    phenotypes : array of floats
+        phenotype at each temperature, with shape (len(temperatures),) or
+        (number of rows, len(temperatures)).
+    """
+    if phenotype_type not in ("stability", "fracfolded", "partition_function", "log_partition_function"):
+        raise Exception("phenotype_type must be 'stability', 'fracfolded', 'partition_function' "
+            "or 'log_partition_function'.")
+    energies = np.asarray(energies, dtype=float)
+    temperatures = np.atleast_1d(np.asarray(temperatures, dtype=float))
+    phenotypes = np.empty(energies.shape[:-1] + temperatures.shape, dtype=float)
+    for i, temperature in enumerate(temperatures):
+        if phenotype_type == "partition_function":
+            phenotypes[..., i] = partition_function_from_energies(energies, temperature,
+                degeneracy=degeneracy)
+            continue
+        if phenotype_type == "log_partition_function":
+            phenotypes[..., i] = log_partition_function_from_energies(energies, temperature,
+                degeneracy=degeneracy)
+            continue
+        stability, folded = stability_from_energies(energies, temperature, minE=minE,
+            degeneracy=degeneracy, native=native)
+        if phenotype_type == "fracfolded":
+            phenotypes[..., i] = fracfolded_from_stability(stability, temperature)
+        else:
+            phenotypes[..., i] = stability
+    return phenotypes
 
 def fold_energy(sequence, conformation, interactions=miyazawa_jernigan):
     """Calculate the energy of the sequence with the given conformation.
@@ -205,31 +1166,382 @@ def lattice_contacts(sequence, conformation):
     contacts : list
         list of contact pairs
     """
-    sites = list(sequence)
-    length = len(sites)
-    try:
-        moves = list(conformation)
-    except TypeError:
-        raise ConformationError("""Protein conformation is None; is there a native state? """)
-    # build a coordinate system, note that odd rotation of intuitive coordinates
-    # since we are working in numpy array grid.
-    coordinates = {"U": [-1,0], "D":[1,0], "L":[0,-1], "R":[0,1]}
-    grid = np.zeros((2*length+1, 2*length+1), dtype=str)
-    x = y = round(length/2.0) # initial position on the grid is at the center of the 2d array
-    grid[x,y] = sites[0]
-    # move on grid, populate with amino acid at that site, and store all contacting neighbors.
-    contacts = []
-    for i in range(length-1):
-        step = coordinates[moves[i]]
-        x += step[0]
-        y += step[1]
-        grid[x,y] = sites[i+1]
-        neighbors = [sites[i+1] + grid[x+c[0], y+c[1]] for c in coordinates.values()]
-        contacts += [n for n in neighbors if n in miyazawa_jernigan]
-    # subtract the contacts that have bonds between them.
-    for i in range(1,length):
-        try:
-            contacts.remove(sequence[i-1:i+1])
+    return [sequence[j] + sequence[i] for i, j in contact_pairs(conformation)]
+
+def contact_pairs(conformation):
+    """Find all non-bonded contacts between sites in a conformation.
+
+    Contacts only depend on the conformation, so they are taken from its
+    cached `Geometry` and the walk does not need a sequence.
+
+    Parameters
+    ----------
+    conformation : str
+        Conformation according to latticemodel's conformations format (e.g. 'UDLLDRU')
+
+    Returns
+    -------
+    pairs : list of tuples
+        sorted list of (i, j) site pairs in contact, with i < j - 1.
+    """
+    return list(geometry(conformation).contacts)
+
+def interaction_matrix(interaction_energies=miyazawa_jernigan):
+    """Convert a dictionary of pairwise interaction energies into a square array.
+
+    Parameters
+    ----------
+    interaction_energies : dict
+        mapping of two-letter contacts (e.g. 'AW') to their energies.
+
+    Returns
+    -------
+    alphabet : dict
+        mapping of each letter to its row/column in `matrix`.
+    matrix : 2d array
+        interaction energies between letters. Missing pairs have zero energy.
+    """
+    letters = sorted(set("".join(interaction_energies.keys())))
+    alphabet = dict([(letter, i) for i, letter in enumerate(letters)])
+    matrix = np.zeros((len(letters), len(letters)), dtype=float)
+    for pair, energy in interaction_energies.items():
+        a, b = alphabet[pair[0]], alphabet[pair[1]]
+        matrix[a, b] = energy
+        # Don't overwrite the reverse pair if it is defined separately.
+        if pair[1] + pair[0] not in interaction_energies:
+            matrix[b, a] = energy
+    return alphabet, matrix
+
+def encode_sequence(sequence, alphabet):
+    """Convert a sequence into an array of indices in `alphabet`.
+    """
+    return np.array([alphabet[s] for s in sequence], dtype=int)
+
+def encode_sequences(sequences, alphabet):
+    """Convert a list of equal-length sequences into a 2d array of indices in
+    `alphabet`.
+    """
+    sequences = ["".join(s) for s in sequences]
+    table = np.empty(256, dtype=int)
+    table.fill(-1)
+    for letter, i in alphabet.items():
+        table[ord(letter)] = i
+    length = len(sequences[0]) if len(sequences) > 0 else 0
+    chars = np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+    if len(chars) != length * len(sequences):
+        raise Exception("All sequences must have the same length.")
+    encoded = table[chars].reshape(len(sequences), length)
+    if np.any(encoded < 0):
+        raise KeyError("sequences contain letters without interaction energies.")
+    return encoded
+
+
+class ConformationIndex(object):
+    """Index of the contacts in a list of conformations.
+
+    The contacts in a conformation do not depend on its sequence, so each
+    conformation is walked once and its non-bonded site pairs are stored as
+    integer arrays. Sequences are then scored by gathering pair energies from
+    these arrays instead of walking every conformation again.
+
+    Parameters
+    ----------
+    conf_list : list of str
+        Conformations according to latticemodel's conformations format (e.g. 'UDLLDRU'),
+        or a conformations.PackedConformations object.
+    degeneracy : array of ints (optional)
+        number of conformations that each entry in `conf_list` stands for.
+        Defaults to one each.
+    contacts : tuple of arrays (optional)
+        precomputed (contact_i, contact_j, conf_ids) arrays, with each
+        conformation's contacts sorted. If given, the conformations aren't
+        walked again (see `conformations.enumerate_conformations`).
+
+    Attributes
+    ----------
+    conf_list : list of str
+        conformations in the index.
+    degeneracy : array of ints
+        number of conformations that each entry in `conf_list` stands for.
+    length : int
+        length of sequences that fold into these conformations.
+    contact_i : array of ints
+        first site of each contact.
+    contact_j : array of ints
+        second site of each contact.
+    conf_ids : array of ints
+        position in `conf_list` of the conformation that each contact belongs to.
+    """
+    def __init__(self, conf_list, degeneracy=None, contacts=None):
+        # Packed conformations (see conformations.PackedConformations) are
+        # kept packed and only decoded when a conformation is looked up.
+        if hasattr(conf_list, "decode"):
+            self.conf_list = conf_list
+        else:
+            self.conf_list = list(conf_list)
+        if len(self.conf_list) == 0:
+            raise Exception("conf_list must have at least one conformation.")
+        if degeneracy is None:
+            degeneracy = np.ones(len(self.conf_list), dtype=int)
+        self.degeneracy = np.asarray(degeneracy, dtype=int)
+        if len(self.degeneracy) != len(self.conf_list):
+            raise Exception("degeneracy must have the same length as conf_list.")
+        self.length = len(self.conf_list[0]) + 1
+        if contacts is None:
+            contact_i, contact_j, conf_ids = [], [], []
+            for n, conf in enumerate(self.conf_list):
+                if len(conf) != self.length - 1:
+                    raise Exception("All conformations must have the same length.")
+                # Don't fill the geometry cache with every conformation.
+                for i, j in Geometry(conf).contacts:
+                    contact_i.append(i)
+                    contact_j.append(j)
+                    conf_ids.append(n)
+            contacts = (contact_i, contact_j, conf_ids)
+        self.contact_i = np.asarray(contacts[0], dtype=int)
+        self.contact_j = np.asarray(contacts[1], dtype=int)
+        self.conf_ids = np.asarray(contacts[2], dtype=int)
+
+    @property
+    def pairs(self):
+        """Unique (i, j) site pairs that are in contact in any conformation."""
+        try:
+            return self._pairs
+        except AttributeError:
+            self._build_incidence()
+            return self._pairs
+
+    @property
+    def incidence(self):
+        """Matrix of unique contact sets by pairs, with 1 where a pair is in the set.
+
+        Conformations with identical contacts share a row, so they always get
+        identical energies. Use `set_ids` to map rows back onto conformations.
+        """
+        try:
+            return self._incidence
+        except AttributeError:
+            self._build_incidence()
+            return self._incidence
+
+    @property
+    def set_ids(self):
+        """Row in `incidence` of each conformation's contact set."""
+        try:
+            return self._set_ids
+        except AttributeError:
+            self._build_incidence()
+            return self._set_ids
+
+    @property
+    def digest(self):
+        """Hash of the conformations and their degeneracies; see `cache.conformations_hash`."""
+        try:
+            return self._digest
+        except AttributeError:
+            self._digest = conformations_hash(self.conf_list, degeneracy=self.degeneracy)
+            return self._digest
+
+    def compress(self):
+        """Merge conformations with identical contacts into one entry.
+
+        Every sequence has the same energy in conformations with the same
+        contacts, so they can be scored once and weighted by their degeneracy
+        in the partition function.
+
+        Returns
+        -------
+        index : ConformationIndex
+            index with one conformation per unique contact set (the first in
+            `conf_list`) and the number of conformations it stands for in
+            `degeneracy`.
+        """
+        first = np.unique(self.set_ids, return_index=True)[1]
+        degeneracy = np.bincount(self.set_ids, weights=self.degeneracy)
+        if hasattr(self.conf_list, "decode"):
+            conf_list = self.conf_list[first]
+        else:
+            conf_list = [self.conf_list[i] for i in first]
+        return ConformationIndex(conf_list, degeneracy=degeneracy.astype(int))
+
+    def _build_incidence(self):
+        """Build the contact-set by pair incidence matrix."""
+        codes = self.contact_i * self.length + self.contact_j
+        codes, columns = np.unique(codes, return_inverse=True)
+        self._pairs = np.column_stack((codes // self.length, codes % self.length))
+        incidence = np.zeros((len(self), len(codes)), dtype=np.uint8)
+        incidence[self.conf_ids, columns] = 1
+        incidence, set_ids = np.unique(incidence, axis=0, return_inverse=True)
+        self._incidence = incidence.astype(float)
+        self._set_ids = set_ids.ravel()
+
+    def __len__(self):
+        return len(self.conf_list)
+
+    def __contains__(self, conformation):
+        try:
+            self.index(conformation)
+            return True
         except ValueError:
-            contacts.remove(sequence[i] + sequence[i-1])
-    return contacts
+            return False
+
+    def index(self, conformation):
+        """Get the position of a conformation in the index."""
+        if hasattr(self.conf_list, "decode"):
+            return self.conf_list.index(conformation)
+        try:
+            positions = self._positions
+        except AttributeError:
+            positions = dict([(conf, n) for n, conf in reversed(list(enumerate(self.conf_list)))])
+            self._positions = positions
+        try:
+            return positions[conformation]
+        except KeyError:
+            raise ValueError("%s is not in the conformation index." % conformation)
+
+    def find(self, conformation):
+        """Get the position of a conformation, or of a conformation with the same
+        contacts if it isn't in the index (e.g. after `compress`).
+        """
+        try:
+            return self.index(conformation)
+        except ValueError:
+            pass
+        codes = [i * self.length + j for i, j in contact_pairs(conformation)]
+        pairs = self.pairs[:, 0] * self.length + self.pairs[:, 1]
+        row = np.zeros(len(pairs), dtype=float)
+        columns = np.searchsorted(pairs, codes)
+        if len(codes) > 0 and (columns.max() >= len(pairs) or not np.all(pairs[columns] == codes)):
+            raise ValueError("%s is not in the conformation index." % conformation)
+        row[columns] = 1
+        matches = np.where((self.incidence == row).all(axis=1))[0]
+        if len(matches) == 0:
+            raise ValueError("%s is not in the conformation index." % conformation)
+        return int(np.argmax(self.set_ids == matches[0]))
+
+    def energies(self, sequence, interaction_energies=miyazawa_jernigan):
+        """Calculate the energy of a sequence in every conformation in the index.
+
+        Parameters
+        ----------
+        sequence : str
+            Amino acid sequence to fold.
+        interaction_energies : dict
+            mapping of two-letter contacts to their energies.
+
+        Returns
+        -------
+        energies : array of floats
+            energy of the sequence in each conformation.
+        """
+        if len(sequence) != self.length:
+            raise Exception("sequence must have the same length as the conformations.")
+        alphabet, matrix = interaction_matrix(interaction_energies)
+        seq = encode_sequence(sequence, alphabet)
+        contacts = matrix[seq[self.contact_j], seq[self.contact_i]]
+        return np.bincount(self.conf_ids, weights=contacts, minlength=len(self))
+
+    def site_contacts(self, site):
+        """Get the contacts that touch a site.
+
+        Returns
+        -------
+        partners : array of ints
+            site on the other side of each contact.
+        conf_ids : array of ints
+            conformation that each contact belongs to.
+        first : array of bools
+            True where `site` is the first site (i) of the contact.
+        """
+        try:
+            return self._site_contacts[site]
+        except AttributeError:
+            self._site_contacts = {}
+        except KeyError:
+            pass
+        first = self.contact_i == site
+        second = self.contact_j == site
+        touching = first | second
+        partners = np.where(first, self.contact_j, self.contact_i)[touching]
+        self._site_contacts[site] = (partners, self.conf_ids[touching], first[touching])
+        return self._site_contacts[site]
+
+    def mutation_deltas(self, sequence, site, aa, interactions):
+        """Calculate the change in energy of every conformation when `site` in
+        `sequence` is mutated to `aa`.
+
+        Parameters
+        ----------
+        sequence : str
+            Amino acid sequence before the mutation.
+        site : int
+            index of the mutated site.
+        aa : str
+            amino acid at `site` after the mutation.
+        interactions : tuple
+            (alphabet, matrix) pair returned by `interaction_matrix`.
+
+        Returns
+        -------
+        deltas : array of floats
+            change in energy of each conformation.
+        """
+        alphabet, matrix = interactions
+        seq = encode_sequence(sequence, alphabet)
+        partners, conf_ids, first = self.site_contacts(site)
+        partners = seq[partners]
+        old, new = seq[site], alphabet[aa]
+        # contacts are stored as matrix[sequence[j], sequence[i]].
+        before = np.where(first, matrix[partners, old], matrix[old, partners])
+        after = np.where(first, matrix[partners, new], matrix[new, partners])
+        return np.bincount(conf_ids, weights=after - before, minlength=len(self))
+
+    def site_deltas(self, sequence, site, amino_acids, interactions):
+        """Calculate the change in energy of every conformation when `site` in
+        `sequence` is mutated to each of `amino_acids`.
+
+        Returns
+        -------
+        deltas : 2d array of floats
+            change in energy with shape (number of amino acids, number of
+            conformations).
+        """
+        alphabet, matrix = interactions
+        seq = encode_sequence(sequence, alphabet)
+        partners, conf_ids, first = self.site_contacts(site)
+        partners = seq[partners]
+        old = seq[site]
+        new = np.array([alphabet[aa] for aa in amino_acids], dtype=int)[:, None]
+        # contacts are stored as matrix[sequence[j], sequence[i]].
+        before = np.where(first, matrix[partners, old], matrix[old, partners])
+        after = np.where(first, matrix[partners, new], matrix[new, partners])
+        # Offset each amino acid's conformations to sum all rows in one bincount.
+        ids = conf_ids + len(self) * np.arange(len(new))[:, None]
+        deltas = np.bincount(ids.ravel(), weights=(after - before).ravel(),
+            minlength=len(self) * len(new))
+        return deltas.reshape(len(new), len(self))
+
+    def energy_matrix(self, sequences, interaction_energies=miyazawa_jernigan):
+        """Calculate the energies of many sequences in every conformation.
+
+        Parameters
+        ----------
+        sequences : list of str
+            Amino acid sequences to fold.
+        interaction_energies : dict
+            mapping of two-letter contacts to their energies.
+
+        Returns
+        -------
+        energies : 2d array of floats
+            energies with shape (number of sequences, number of conformations).
+        """
+        alphabet, matrix = interaction_matrix(interaction_energies)
+        seqs = encode_sequences(sequences, alphabet)
+        if seqs.shape[1] != self.length:
+            raise Exception("sequences must have the same length as the conformations.")
+        # Energy of every contacting pair for each sequence, then sum pairs in
+        # each contact set with a single matrix product.
+        pairs = matrix[seqs[:, self.pairs[:, 1]], seqs[:, self.pairs[:, 0]]]
+        energies = np.dot(pairs, self.incidence.T)
+        return energies[:, self.set_ids]
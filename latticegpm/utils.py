@@ -1,3 +1,5 @@
+import numpy as np
+
 
 
 class ConformationError(Exception):
@@ -22,3 +24,33 @@ def mutations_map(s1, s2):
         else:
             mutations[i] = [s1[i], s2[i]]
     return mutations
+
+def binary_sites(wildtype, mutations):
+    """ Get the sites of a binary map that have a mutation, in order, and
+    the mutant letter at each. Raise an error if any site has more than
+    one mutant letter.
+    """
+    sites, mutants = [], []
+    for site in sorted(mutations):
+        letters = mutations[site]
+        if letters is None:
+            continue
+        others = [l for l in letters if l != wildtype[site]]
+        if len(others) > 1:
+            raise Exception("Site %s has more than two letters; the map is not binary." % site)
+        if len(others) == 1:
+            sites.append(site)
+            mutants.append(others[0])
+    return sites, mutants
+
+def binary_index(genotypes, wildtype, sites):
+    """ Get the position of each genotype on the binary hypercube of `sites`.
+    Bit n-1-k of a position is set when sites[k] is mutated, so positions
+    sort like the genotypes' binary strings.
+    """
+    n = len(sites)
+    letters = np.frombuffer("".join(genotypes).encode("ascii"), dtype=np.uint8)
+    letters = letters.reshape(len(genotypes), -1)[:, sites]
+    reference = np.frombuffer("".join([wildtype[s] for s in sites]).encode("ascii"), dtype=np.uint8)
+    weights = 1 << np.arange(n - 1, -1, -1, dtype=np.int64)
+    return (letters != reference).astype(np.int64) @ weights
@@ -0,0 +1,18 @@
+import numpy as np
+
+from latticegpm.cache import PhenotypeCache, EVICT_FRACTION
+
+def test_eviction_keeps_tables_under_max_entries_without_counting_every_insert(tmp_path):
+    cache = PhenotypeCache(str(tmp_path / "cache.sqlite"), max_entries=100)
+    statements = []
+    cache.connection.set_trace_callback(statements.append)
+    for i in range(1000):
+        cache.set_energies("S%d" % i, "model", np.arange(3, dtype=float))
+        assert cache._count("energies") <= 100
+    counts = [s for s in statements if "COUNT(*)" in s]
+    # One count per batch of evictions, plus the checks above.
+    assert len(counts) - 1000 < 1000 * EVICT_FRACTION
+    # The most recently used entries are kept.
+    assert cache.get_energies("S999", "model") is not None
+    assert cache.get_energies("S0", "model") is None
+    assert cache.evictions == 1000 - cache._count("energies")
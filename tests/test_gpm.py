@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from latticegpm.conformations import PackedConformations, enumerate_conformations
+from latticegpm.gpm import LatticeGenotypePhenotypeMap
+from latticegpm.thermo import LatticeThermodynamicsMatrix
+from latticegpm.stats import Stats
+
+WILDTYPE = "KDLMPHEAVC"
+MUTANT = "RSLMWHEYVC"
+
+@pytest.fixture(scope="module")
+def gpm():
+    mutations = dict([(site, sorted(set([w, m]))) for site, (w, m) in enumerate(zip(WILDTYPE, MUTANT))])
+    return LatticeGenotypePhenotypeMap(WILDTYPE, mutations, conformations=enumerate_conformations(10))
+
+def test_phenotypes_share_memory_with_table(gpm):
+    for phenotype_type in ("fracfolded", "native_energy", "stability"):
+        gpm.phenotype_type = phenotype_type
+        assert np.shares_memory(gpm.phenotypes, gpm.table[phenotype_type])
+        assert np.array_equal(gpm.data["phenotypes"].values, gpm.table[phenotype_type])
+
+def test_accessible_paths_needs_a_fitness(gpm):
+    gpm.phenotype_type = "stability"
+    with pytest.raises(Exception):
+        gpm.accessible_paths()
+    gpm.phenotype_type = "fracfolded"
+    n_paths, probability = gpm.accessible_paths()
+    assert n_paths >= 0 and 0 <= probability <= 1
+
+def test_fold_stage_times_the_table_build():
+    stats = Stats()
+    mutations = dict([(site, sorted(set([w, m]))) for site, (w, m) in enumerate(zip(WILDTYPE, MUTANT))])
+    gpm = LatticeGenotypePhenotypeMap(WILDTYPE, mutations, conformations=enumerate_conformations(10),
+        stats=stats)
+    # The inner energies and thermodynamics stages run inside the fold stage.
+    assert stats.timings["fold"] >= stats.timings["energies"] + stats.timings["thermodynamics"]
+
+def test_map_from_packed_conformations(gpm):
+    packed = enumerate_conformations(10).conf_list
+    assert isinstance(packed, PackedConformations)
+    mutations = dict([(site, sorted(set([w, m]))) for site, (w, m) in enumerate(zip(WILDTYPE, MUTANT))])
+    other = LatticeGenotypePhenotypeMap(WILDTYPE, mutations, conformations=packed,
+        phenotype_type="stability")
+    assert isinstance(other.latticeproteins, LatticeThermodynamicsMatrix)
+    assert np.allclose(other.table["stability"], gpm.table["stability"])
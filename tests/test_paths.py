@@ -0,0 +1,30 @@
+import itertools
+import numpy as np
+import pytest
+
+from latticegpm.paths import count_accessible_paths, path_probability, top_paths
+
+def test_count_accessible_paths_matches_enumeration():
+    rng = np.random.RandomState(0)
+    for n in range(1, 7):
+        fitness = rng.rand(1 << n) + 0.1
+        n_paths = 0
+        for sites in itertools.permutations(range(n)):
+            genotypes = np.cumsum([0] + [1 << (n - 1 - site) for site in sites])
+            n_paths += np.all(np.diff(fitness[genotypes]) > 0)
+        assert count_accessible_paths(fitness) == n_paths
+
+def test_top_paths_sum_to_path_probability():
+    fitness = 1.0 + np.arange(1 << 5) + np.random.RandomState(1).rand(1 << 5)
+    paths, probabilities = top_paths(fitness, 200)
+    assert len(paths) == count_accessible_paths(fitness)
+    assert np.isclose(probabilities.sum(), path_probability(fitness))
+
+@pytest.mark.parametrize("bad", [0.0, -1.0])
+def test_nonpositive_fitness_raises(bad):
+    fitness = 1.0 + np.arange(1 << 3, dtype=float)
+    fitness[3] = bad
+    with pytest.raises(Exception):
+        path_probability(fitness)
+    with pytest.raises(Exception):
+        top_paths(fitness)
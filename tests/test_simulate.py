@@ -0,0 +1,19 @@
+import numpy as np
+
+from latticegpm.simulate import _wright_fisher
+
+class Unfolded(object):
+    """Landscape on which no genotype folds."""
+    letters = np.array(list("ACDE"))
+
+    def fitness(self, genotypes):
+        return np.zeros(len(genotypes), dtype=float)
+
+def test_wright_fisher_resamples_uniformly_without_fitness():
+    rngs = [np.random.Generator(np.random.PCG64(seed)) for seed in range(3)]
+    wildtype = np.zeros(6, dtype=np.uint8)
+    population, mean_fitness = _wright_fisher(Unfolded(), wildtype, rngs, 5, 20, 0.1)
+    assert population.shape == (3, 20, 6)
+    assert np.all(mean_fitness == 0)
+    # Mutations still accumulate while the populations drift.
+    assert np.any(population != 0)
@@ -0,0 +1,156 @@
+import warnings
+import itertools
+import numpy as np
+import pytest
+
+from latticeproteins.interactions import miyazawa_jernigan
+
+from latticegpm.conformations import enumerate_conformations, save_conformations, load_conformations
+from latticegpm.thermo import (LatticeThermodynamics,
+    LatticeThermodynamicsMatrix,
+    energy_list,
+    energy_matrix,
+    fold_energy,
+    stability_from_energies,
+    thermodynamics_from_energies,
+    partition_function,
+    stability_from_conf_list,
+    fracfolded_from_conf_list)
+from latticegpm.cache import MemoryCache, PhenotypeCache, PHENOTYPES
+from latticegpm.stats import Stats
+
+AMINO_ACIDS = sorted(set("".join(miyazawa_jernigan.keys())))
+
+@pytest.fixture(scope="module")
+def index():
+    return enumerate_conformations(10)
+
+def random_mutations(rng, sequence, n):
+    """`n` random (site, amino acid) mutations and the sequence they lead to."""
+    mutations = [(rng.randint(len(sequence)), rng.choice(AMINO_ACIDS)) for i in range(n)]
+    for site, aa in mutations:
+        sequence = sequence[:site] + aa + sequence[site+1:]
+    return mutations, sequence
+
+def test_mutate_matches_fresh_fold_with_target_at_low_temperature(index):
+    # The target is the lowest conformation of the final mutant, so the native
+    # state dominates the partition function and rounding errors matter most.
+    rng = np.random.RandomState(0)
+    for trial in range(100):
+        sequence = "".join(rng.choice(AMINO_ACIDS, size=10))
+        mutations, final = random_mutations(rng, sequence, 6)
+        target = index.conf_list[int(np.argmin(energy_list(final, index)))]
+        for temperature in (0.02, 0.05):
+            lattice = LatticeThermodynamics(sequence, index, temperature, target=target)
+            for site, aa in mutations:
+                lattice = lattice.mutate(site, aa)
+            fresh = LatticeThermodynamics(final, index, temperature, target=target)
+            assert np.isfinite(lattice.stability)
+            assert np.isclose(lattice.stability, fresh.stability)
+            assert np.allclose(lattice.at_temperatures([0.02, 1.0]), fresh.at_temperatures([0.02, 1.0]))
+
+def test_mutate_and_revert_matches_parent_with_target(index):
+    rng = np.random.RandomState(1)
+    for trial in range(100):
+        sequence = "".join(rng.choice(AMINO_ACIDS, size=10))
+        target = index.conf_list[int(np.argmin(energy_list(sequence, index)))]
+        parent = LatticeThermodynamics(sequence, index, 0.02, target=target)
+        site = rng.randint(10)
+        mutant = parent.mutate(site, rng.choice(AMINO_ACIDS)).mutate(site, sequence[site])
+        assert mutant.sequence == sequence
+        assert np.isfinite(mutant.stability)
+        assert np.isclose(mutant.stability, parent.stability)
+
+def test_log_partition_function_is_finite_at_low_temperature(index, tmp_path):
+    rng = np.random.RandomState(2)
+    sequences = ["".join(rng.choice(AMINO_ACIDS, size=10)) for i in range(20)]
+    temperature = 0.02
+    energies = np.array([energy_list(s, index) for s in sequences])
+    exponents = -energies / temperature
+    expected = exponents.max(axis=1) + np.log(np.exp(exponents - exponents.max(axis=1)[:, None]).sum(axis=1))
+    for cache in (None, MemoryCache(), PhenotypeCache(str(tmp_path / "cache.sqlite"))):
+        for repeat in range(2):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                lattice = LatticeThermodynamicsMatrix(sequences, index, temperature, cache=cache)
+                table = lattice.table
+            for name in PHENOTYPES:
+                assert np.all(np.isfinite(np.asarray(table[name], dtype=float)))
+            assert np.allclose(table["log_partition_function"], expected)
+            assert np.isclose(LatticeThermodynamics(sequences[0], index, temperature).log_partition_function,
+                expected[0])
+
+def test_conf_list_functions_match_on_compressed_and_loaded_index(index, tmp_path):
+    compressed = index.compress()
+    save_conformations(str(tmp_path / "store"), compressed)
+    loaded = load_conformations(str(tmp_path / "store"))
+    assert len(compressed) < len(index)
+    rng = np.random.RandomState(3)
+    for trial in range(50):
+        sequence = "".join(rng.choice(AMINO_ACIDS, size=10))
+        # Targets from the full list are often merged away by compression.
+        target = index.conf_list[rng.randint(len(index))]
+        for temperature in (0.1, 1.0):
+            expected = partition_function(sequence, index, temperature)
+            stability, folded = stability_from_conf_list(sequence, index, temperature)
+            target_stability = stability_from_conf_list(sequence, index, temperature, target=target)[0]
+            fracfolded = fracfolded_from_conf_list(sequence, index, temperature, target=target)
+            for other in (compressed, loaded):
+                assert np.isclose(partition_function(sequence, other, temperature), expected)
+                assert np.isclose(stability_from_conf_list(sequence, other, temperature)[0], stability)
+                assert stability_from_conf_list(sequence, other, temperature)[1] == folded
+                assert np.isclose(stability_from_conf_list(sequence, other, temperature, target=target)[0],
+                    target_stability)
+                assert np.isclose(fracfolded_from_conf_list(sequence, other, temperature, target=target),
+                    fracfolded)
+
+def test_graycode_strategy_with_cache(index):
+    wildtype, mutant = "KDLMPHEAVC", "RSLMWHEYVC"
+    sequences = ["".join(letters) for letters in itertools.product(*[sorted(set(pair))
+        for pair in zip(wildtype, mutant)])]
+    expected = LatticeThermodynamicsMatrix(sequences, index, 1.0).table
+    cache = MemoryCache()
+    # Nothing is cached, so the whole space is folded in Gray-code order.
+    stats = Stats()
+    table = LatticeThermodynamicsMatrix(sequences, index, 1.0, cache=cache, strategy="graycode",
+        stats=stats).table
+    assert "graycode" in stats.timings
+    assert np.allclose(table["stability"], expected["stability"])
+    # Half are cached; the rest aren't a complete space and fall back to 'matrix'.
+    cache = MemoryCache()
+    LatticeThermodynamicsMatrix(sequences[::2], index, 1.0, cache=cache).table
+    with pytest.warns(UserWarning):
+        table = LatticeThermodynamicsMatrix(sequences, index, 1.0, cache=cache, strategy="graycode").table
+    assert np.allclose(table["stability"], expected["stability"])
+
+def test_fold_energy_target_matches_energy_matrix_rows():
+    # fold_energy and energy_matrix sum contacts in different orders, so the
+    # target's energy can differ from its column in the last bit.
+    index = enumerate_conformations(12)
+    rng = np.random.RandomState(4)
+    sequences = ["".join(rng.choice(AMINO_ACIDS, size=12)) for i in range(100)]
+    energies = energy_matrix(sequences, index)
+    for sequence, row in zip(sequences, energies):
+        target = index.conf_list[int(np.argmin(row))]
+        minE = fold_energy(sequence, target)
+        stability, folded = stability_from_energies(row, 0.05, minE=minE)
+        expected, folded = stability_from_energies(row, 0.05, native=index.index(target))
+        assert np.isfinite(stability)
+        assert np.isclose(stability, expected)
+    minE = [fold_energy(s, index.conf_list[int(np.argmin(row))]) for s, row in zip(sequences, energies)]
+    table = thermodynamics_from_energies(energies, 0.05, minE=minE)
+    assert np.all(np.isfinite(table["stability"]))
+    assert np.all(table["native_conf"] == np.argmin(energies, axis=1))
+
+def test_scan_mutants_counts_partial_cache_hits(index):
+    cache = MemoryCache()
+    # No site already holds one of the scanned amino acids.
+    sequence = "KWLMPHGIVW"
+    LatticeThermodynamics(sequence, index, 1.0, cache=cache).scan_mutants(amino_acids=["A", "C"])
+    stats = Stats()
+    amino_acids = ["A", "C", "D", "E"]
+    LatticeThermodynamics(sequence, index, 1.0, cache=cache, stats=stats).scan_mutants(amino_acids=amino_acids)
+    # One lookup per mutant, plus one for the parent's energies (a hit).
+    lookups = len(sequence) * len(amino_acids) + 1
+    assert stats.counters["cache_hits"] + stats.counters["cache_misses"] == lookups
+    assert stats.counters["cache_hits"] == len(sequence) * 2 + 1